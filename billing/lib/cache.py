@@ -1,30 +1,354 @@
 """
 The cache utilities
 """
+import hashlib
+import json
+import time
+import uuid
 from functools import wraps
 
 from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db.models import Manager, Model
+from django.http.response import HttpResponse
+from rest_framework_extensions.cache.decorators import CacheResponse
+from rest_framework_extensions.key_constructor.bits import (KeyBitBase,
+                                                            QueryParamsKeyBit)
+from rest_framework_extensions.key_constructor.constructors import (
+    DefaultKeyConstructor, DefaultListKeyConstructor,
+    DefaultObjectKeyConstructor)
 
+from billing.lib.stats import record_cache
 
-def cache_result(func):
+TAG_KEY = 'cache_tag_{}'
+
+# Single-flight recomputation of the missing keys (sec)
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+# The hit/miss counters of the cache_result functions by the function name
+cache_result_stats = {}  # type: dict
+
+
+def get_model_tag(model, pk=None) -> str:
+    """
+    Get the cache tag of the model or the model instance
+    The model can be a model class, a model instance or a model label.
+    """
+    if isinstance(model, Model):
+        pk = model.pk if pk is None else pk
+    if isinstance(model, str):
+        label = model.lower()
+    else:
+        label = model._meta.label_lower
+    return label if pk is None else '{}:{}'.format(label, pk)
+
+
+def get_tags_version(tags) -> str:
+    """
+    Get the combined version of the cache tags
+    """
+    keys = sorted({TAG_KEY.format(get_model_tag(t)) for t in tags})
+    if not keys:
+        return ''
+    versions = cache.get_many(keys)
+    missing = [k for k in keys if k not in versions]
+    for key in missing:
+        cache.add(key, uuid.uuid4().hex, None)
+    if missing:
+        versions.update(cache.get_many(missing))
+
+    return hashlib.md5(':'.join(
+        [str(versions.get(k)) for k in keys]).encode('utf-8')).hexdigest()
+
+
+def invalidate_tags(*tags) -> None:
+    """
+    Invalidate the cache entries tagged with the tags
+    """
+    cache.delete_many([TAG_KEY.format(get_model_tag(t)) for t in tags])
+
+
+def invalidate_model(instance) -> None:
+    """
+    Invalidate the cache entries tagged with the model or its instance
+    """
+    invalidate_tags(get_model_tag(type(instance)), get_model_tag(instance))
+
+
+def get_or_compute(key,
+                   getter,
+                   timeout=DEFAULT_TIMEOUT,
+                   stale_key=None,
+                   cache_if=None):
+    """
+    Get the cached value or compute it in a single process
+
+    Only the process that has acquired the key lock calls the getter.
+    The others serve the stale value if the stale_key is provided or
+    wait for the value a few seconds before computing it by themselves.
+    The cached values must not be None.
+    """
+    value = cache.get(key)
+    if value is not None:
+        record_cache(True)
+        return value
+
+    def compute():
+        record_cache(False)
+        value = getter()
+        if cache_if is None or cache_if(value):
+            cache.set(key, value, timeout)
+            if stale_key:
+                cache.set(stale_key, value)
+        return value
+
+    lock_key = '{}:lock'.format(key)
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            return compute()
+        finally:
+            cache.delete(lock_key)
+
+    if stale_key:
+        value = cache.get(stale_key)
+        if value is not None:
+            record_cache(True)
+            return value
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            record_cache(True)
+            return value
+        if cache.get(lock_key) is None:
+            break
+
+    return compute()
+
+
+def _serialize_arg(value):
+    """
+    Get the stable representation of the cached function argument
+    """
+    if isinstance(value, Manager):
+        return '{}.{}'.format(value.model._meta.label_lower, value.name)
+    if isinstance(value, Model):
+        return get_model_tag(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted([_serialize_arg(v) for v in value], key=str)
+    return str(value)
+
+
+def get_result_key(name: str, version, args, kwargs) -> str:
+    """
+    Get the cache key of the function result
+    """
+    data = json.dumps([args, kwargs], sort_keys=True, default=_serialize_arg)
+    return 'cache_result:{}:{}:{}'.format(
+        name, version,
+        hashlib.md5(data.encode('utf-8')).hexdigest())
+
+
+def cache_result(func=None,
+                 tags=(),
+                 timeout=DEFAULT_TIMEOUT,
+                 version=1,
+                 name=None,
+                 stale=False):
     """
     The decorator for caching the function result
+
+    The key is built from the qualified function name, the version and
+    the serialized arguments, so it is the same in all processes.
+    The result is invalidated when one of the tagged models has been changed.
+    A missing result is computed by a single process at once, the others
+    wait for it or get the previous result if stale is True.
+
+    The wrapper provides:
+    invalidate(*args, **kwargs) - invalidate the result for the arguments
+    invalidate_all() - invalidate all results of the function
+    stats - the process hit/miss counters
+    """
+
+    def decorator(func):
+        func_name = name or '{}.{}'.format(func.__module__, func.__qualname__)
+        namespace = 'cache_result:{}'.format(func_name)
+        stats = cache_result_stats.setdefault(func_name, {
+            'hits': 0,
+            'misses': 0
+        })
+
+        def get_key(*args, **kwargs):
+            key = get_result_key(func_name, version, args, kwargs)
+            return '{}:{}'.format(
+                key, get_tags_version(tuple(tags) + (namespace, )))
+
+        @wraps(func)
+        def with_cache(*args, **kwargs):
+            """
+            Cached function
+            """
+            computed = []
+
+            def getter():
+                computed.append(True)
+                return (func(*args, **kwargs), )
+
+            stale_key = None
+            if stale:
+                stale_key = '{}:stale'.format(
+                    get_result_key(func_name, version, args, kwargs))
+            result = get_or_compute(
+                key=get_key(*args, **kwargs),
+                getter=getter,
+                timeout=timeout,
+                stale_key=stale_key,
+            )
+            stats['misses' if computed else 'hits'] += 1
+
+            return result[0]
+
+        def invalidate(*args, **kwargs):
+            cache.delete(get_key(*args, **kwargs))
+
+        def invalidate_all():
+            invalidate_tags(namespace)
+
+        with_cache.get_key = get_key
+        with_cache.invalidate = invalidate
+        with_cache.invalidate_all = invalidate_all
+        with_cache.stats = stats
+
+        return with_cache
+
+    return decorator(func) if func else decorator
+
+
+class CacheTagsKeyBit(KeyBitBase):
+    """
+    The version of the view cache tags
+    The tags are taken from the view cache_tags attribute
+    or from the view queryset model.
+    """
+
+    def get_data(self, params, view_instance, view_method, request, args,
+                 kwargs):
+        tags = getattr(view_instance, 'cache_tags', None)
+        if not tags:
+            tags = [view_instance.get_queryset().model]
+        return get_tags_version(tags)
+
+
+class TaggedKeyConstructorMixin(object):
     """
+    The key constructor with the stale key (the key without the tags)
+    """
+
+    def get_stale_key(self, **kwargs):
+        data = self.get_data_from_bits(**kwargs)
+        data.pop('tags', None)
+        return '{}:stale'.format(self.prepare_key(data))
+
+
+class TaggedObjectKeyConstructor(TaggedKeyConstructorMixin,
+                                 DefaultObjectKeyConstructor):
+    tags = CacheTagsKeyBit()
+
 
-    @wraps(func)
-    def with_cache(*args, **kwargs):
-        """
-        Cached function
-        """
-        key = '{}{}{}'.format(
-            hash(func), hash(args), hash(frozenset(kwargs.items())))
+class TaggedListKeyConstructor(TaggedKeyConstructorMixin,
+                               DefaultListKeyConstructor):
+    tags = CacheTagsKeyBit()
 
-        cached_result = cache.get(key)
-        if cached_result is not None:
-            return cached_result if cached_result != 'None' else None
-        result = func(*args, **kwargs)
-        cache.set(key, result if result is not None else 'None')
 
-        return result
+class TaggedQueryKeyConstructor(TaggedKeyConstructorMixin,
+                                DefaultKeyConstructor):
+    query_params = QueryParamsKeyBit('*')
+    tags = CacheTagsKeyBit()
 
-    return with_cache
+
+tagged_object_cache_key_func = TaggedObjectKeyConstructor()
+tagged_list_cache_key_func = TaggedListKeyConstructor()
+tagged_query_cache_key_func = TaggedQueryKeyConstructor()
+
+
+class SingleFlightCacheResponse(CacheResponse):
+    """
+    The DRF response cache with the single-flight recomputation
+    A missing response is rendered by a single process at once,
+    the others get the stale response or wait for it.
+    """
+
+    def process_cache_response(self, view_instance, view_method, request,
+                               args, kwargs):
+        key_kwargs = {
+            'view_instance': view_instance,
+            'view_method': view_method,
+            'request': request,
+            'args': args,
+            'kwargs': kwargs,
+        }
+        key = self.calculate_key(**key_kwargs)
+        key_func = self.key_func
+        if isinstance(key_func, str):
+            key_func = getattr(view_instance, key_func)
+        stale_key = None
+        if hasattr(key_func, 'get_stale_key'):
+            stale_key = key_func.get_stale_key(**key_kwargs)
+
+        rendered = []
+
+        def getter():
+            response = view_method(view_instance, request, *args, **kwargs)
+            response = view_instance.finalize_response(
+                request, response, *args, **kwargs)
+            response.render()
+            rendered.append(response)
+            return (response.rendered_content, response.status_code,
+                    response._headers)
+
+        result = get_or_compute(
+            key=key,
+            getter=getter,
+            timeout=self.timeout,
+            stale_key=stale_key,
+            cache_if=lambda r: r[1] < 400 or self.cache_errors,
+        )
+        if rendered:
+            response = rendered[0]
+        else:
+            content, status, headers = result
+            response = HttpResponse(content=content, status=status)
+            response._headers = headers
+
+        if not hasattr(response, '_closable_objects'):
+            response._closable_objects = []
+
+        return response
+
+
+cache_response = SingleFlightCacheResponse
+
+
+class ListCacheResponseMixin(object):
+    @cache_response(key_func='list_cache_key_func')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+
+class RetrieveCacheResponseMixin(object):
+    @cache_response(key_func='object_cache_key_func')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class CacheResponseMixin(RetrieveCacheResponseMixin, ListCacheResponseMixin):
+    """
+    The DRF viewsets response cache mixin with the single-flight
+    recomputation and the tagged keys
+    """
+    object_cache_key_func = tagged_object_cache_key_func
+    list_cache_key_func = tagged_list_cache_key_func
@@ -0,0 +1,221 @@
+"""
+The periodic tasks processing the query objects in chunks
+
+The objects are split by the primary key ranges. The chunks are processed
+by the subtasks. The progress is saved in the cache, so the run interrupted
+by the time limit is resumed by the next task call without processing
+the finished chunks and objects again. The run failed with an error is
+dropped, the next task call starts a new one.
+"""
+import hashlib
+import json
+import logging
+import uuid
+from contextlib import ExitStack
+
+from celery import chord, group
+from celery.exceptions import SoftTimeLimitExceeded
+from django.core.cache import cache
+
+from billing.celery import app
+from billing.lib.locks import CacheLock, locked_task
+
+# The number of objects in a chunk
+CHUNK_SIZE = 100
+
+# The unfinished run is resumed within an hour, then a new run is started
+RUN_TIMEOUT = 60 * 60
+
+# The chunked jobs by the task name
+jobs = {}
+
+
+class ChunkedJob(object):
+    """
+    The chunked processing of the query objects
+    """
+
+    def __init__(self,
+                 name,
+                 get_query,
+                 process,
+                 chunk_size=CHUNK_SIZE,
+                 context=None,
+                 queue=None):
+        self.name = name
+        self.get_query = get_query
+        self.process = process
+        self.chunk_size = chunk_size
+        self.context = context
+        self.options = {'queue': queue} if queue else {}
+        self.logger = logging.getLogger('billing')
+
+    def get_run_key(self, args, kwargs) -> str:
+        data = json.dumps([args, kwargs], sort_keys=True, default=str)
+        return 'chunked_job:{}:{}'.format(
+            self.name,
+            hashlib.md5(data.encode('utf-8')).hexdigest())
+
+    @staticmethod
+    def get_chunk_key(run_id, index) -> str:
+        return 'chunked_job_chunk:{}:{}'.format(run_id, index)
+
+    def get_ranges(self, args, kwargs) -> list:
+        """
+        Split the query objects by the primary key ranges
+        """
+        pks = list(
+            self.get_query(*args, **kwargs).order_by('pk').values_list(
+                'pk', flat=True))
+        return [(pks[i], pks[min(i + self.chunk_size, len(pks)) - 1])
+                for i in range(0, len(pks), self.chunk_size)]
+
+    def dispatch(self, args, kwargs) -> int:
+        """
+        Start or resume the run
+        Returns the number of the dispatched chunks.
+        """
+        run_key = self.get_run_key(args, kwargs)
+        run = cache.get(run_key)
+        if run is None:
+            run = {
+                'id': uuid.uuid4().hex,
+                'ranges': self.get_ranges(args, kwargs),
+            }
+            if not cache.add(run_key, run, RUN_TIMEOUT):
+                return 0
+        else:
+            self.logger.info('Resuming chunked job {} run {}.'.format(
+                self.name, run['id']))
+
+        chunks = []
+        for index, (pk_from, pk_to) in enumerate(run['ranges']):
+            progress = cache.get(self.get_chunk_key(run['id'], index))
+            if progress == 'done':
+                continue
+            chunks.append(
+                app.signature(
+                    'billing.tasks.process_chunk_task',
+                    args=(self.name, run['id'], index, pk_from, pk_to, args,
+                          kwargs),
+                    immutable=True,
+                    **self.options))
+        if not chunks:
+            cache.delete(run_key)
+            return 0
+
+        finish = app.signature(
+            'billing.tasks.finish_chunks_task',
+            args=(self.name, run_key, run['id']),
+            immutable=True)
+        chord(group(chunks))(finish)
+
+        return len(chunks)
+
+    def process_chunk(self, run_id, index, pk_from, pk_to, args,
+                      kwargs) -> int:
+        """
+        Process the chunk objects starting after the last processed one
+        Returns the number of the processed objects.
+
+        If the job has the context, the chunk is processed in it
+        and the progress is saved only after the context exit.
+        """
+        chunk_key = self.get_chunk_key(run_id, index)
+        lock = CacheLock(chunk_key)
+        if not lock.acquire():
+            return 0
+        try:
+            progress = cache.get(chunk_key)
+            if progress == 'done':
+                return 0
+            query = self.get_query(*args, **kwargs).filter(
+                pk__range=(pk_from, pk_to)).order_by('pk')
+            if progress is not None:
+                query = query.filter(pk__gt=progress)
+
+            processed = 0
+            with ExitStack() as stack:
+                if self.context:
+                    stack.enter_context(self.context())
+                for entry in query:
+                    self.process(entry, *args, **kwargs)
+                    if not self.context:
+                        cache.set(chunk_key, entry.pk, RUN_TIMEOUT)
+                    processed += 1
+            cache.set(chunk_key, 'done', RUN_TIMEOUT)
+
+            return processed
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception:
+            self.fail(run_id, args, kwargs)
+            raise
+        finally:
+            lock.release()
+
+    def fail(self, run_id, args, kwargs) -> None:
+        """
+        Drop the failed run
+        """
+        run_key = self.get_run_key(args, kwargs)
+        run = cache.get(run_key)
+        if run and run['id'] == run_id:
+            cache.delete(run_key)
+        self.logger.error('Chunked job {} run {} failed.'.format(
+            self.name, run_id))
+
+    def finish(self, run_key, run_id) -> None:
+        """
+        Finish the run
+        """
+        run = cache.get(run_key)
+        if not run or run['id'] != run_id:
+            return None
+        keys = [
+            self.get_chunk_key(run_id, i) for i in range(len(run['ranges']))
+        ]
+        progress = cache.get_many(keys)
+        if any(progress.get(k) != 'done' for k in keys):
+            return None
+        cache.delete(run_key)
+        self.logger.info('Chunked job {} run {} finished.'.format(
+            self.name, run_id))
+
+
+def chunked_task(get_query,
+                 chunk_size=CHUNK_SIZE,
+                 context=None,
+                 queue=None,
+                 **options):
+    """
+    The decorator of the periodic task processing the query objects in chunks
+
+    The decorated function processes a single object:
+    func(entry, *args, **kwargs). The get_query function gets the task
+    arguments and returns the queryset. The context is the context manager
+    factory wrapping the chunk processing. The task and its chunks are sent
+    to the queue.
+    """
+
+    def decorator(func):
+        name = '{}.{}'.format(func.__module__, func.__name__)
+        job = ChunkedJob(name, get_query, func, chunk_size, context, queue)
+        jobs[name] = job
+
+        @locked_task(name)
+        def dispatch(*args, **kwargs):
+            return job.dispatch(args, kwargs)
+
+        dispatch.__name__ = func.__name__
+        dispatch.__doc__ = func.__doc__
+        dispatch.__module__ = func.__module__
+
+        if queue:
+            options['queue'] = queue
+        task = app.task(name=name, **options)(dispatch)
+        task.job = job
+
+        return task
+
+    return decorator
@@ -0,0 +1,153 @@
+"""
+The circuit breaker and the concurrency limit of the MB hosts
+
+The state is kept in the cache, so it is shared by the workers.
+After MB_CIRCUIT_FAILURES consecutive failures the host circuit opens
+and the requests fail fast. After MB_CIRCUIT_RESET seconds the circuit is
+half-open: a single probe request is allowed, its success closes
+the circuit, its failure opens it again.
+"""
+import logging
+from urllib.parse import urlsplit
+
+import arrow
+from django.conf import settings
+from django.core.cache import cache
+
+CIRCUIT_KEY = 'mb_circuit:{}'
+PROBE_KEY = 'mb_circuit_probe:{}'
+SLOTS_KEY = 'mb_circuit_slots:{}'
+HOSTS_KEY = 'mb_circuit_hosts'
+
+# The failures are forgotten after the period without the failures (sec)
+FAILURES_TTL = 60 * 10
+
+
+def get_host(url: str) -> str:
+    """
+    Get the host of the URL
+    """
+    return urlsplit(url).netloc
+
+
+class HostCircuit(object):
+    """
+    The circuit breaker of the MB host
+    """
+
+    def __init__(self, url: str) -> None:
+        self.host = get_host(url)
+        self.key = CIRCUIT_KEY.format(self.host)
+        self.probe_key = PROBE_KEY.format(self.host)
+        self.slots_key = SLOTS_KEY.format(self.host)
+        self.is_probe = False
+
+    def get_state(self) -> dict:
+        """
+        Get the circuit state: closed, open or half_open
+        """
+        state = cache.get(self.key) or {
+            'host': self.host,
+            'failures': 0,
+            'opened': None,
+        }
+        state['state'] = 'closed'
+        if state['opened']:
+            state['state'] = 'open' if self.get_wait(state) else 'half_open'
+        return state
+
+    def get_wait(self, state=None) -> float:
+        """
+        Get the time before the circuit becomes half-open (sec)
+        """
+        state = state or cache.get(self.key)
+        if not state or not state['opened']:
+            return 0
+        elapsed = (arrow.utcnow() - arrow.get(state['opened'])).total_seconds()
+        return max(0, settings.MB_CIRCUIT_RESET - elapsed)
+
+    def allow(self) -> bool:
+        """
+        Check whether the request to the host is allowed
+        """
+        state = self.get_state()
+        if state['state'] == 'closed':
+            return True
+        if state['state'] == 'open':
+            return False
+        self.is_probe = cache.add(self.probe_key, True,
+                                  settings.MB_TIMEOUT * 2)
+        return self.is_probe
+
+    def acquire(self) -> bool:
+        """
+        Acquire the host concurrency slot
+        The counter expires to recover the slots of the killed workers.
+        """
+        cache.add(self.slots_key, 0, settings.MB_TIMEOUT * 10)
+        try:
+            if cache.incr(self.slots_key) <= settings.MB_HOST_CONCURRENCY:
+                return True
+        except ValueError:
+            return True
+        self.release()
+        return False
+
+    def release(self) -> None:
+        """
+        Release the host concurrency slot
+        """
+        try:
+            if cache.decr(self.slots_key) < 0:
+                cache.set(self.slots_key, 0, settings.MB_TIMEOUT * 10)
+        except ValueError:
+            pass
+
+    def success(self) -> None:
+        """
+        Record the successful request
+        """
+        state = cache.get(self.key)
+        if state and state['opened']:
+            logging.getLogger('billing').info(
+                'Mb host {} circuit closed.'.format(self.host))
+        if state or self.is_probe:
+            cache.delete_many([self.key, self.probe_key])
+        self.is_probe = False
+
+    def failure(self) -> None:
+        """
+        Record the failed request
+        """
+        state = self.get_state()
+        state['failures'] += 1
+        if self.is_probe or (
+                state['state'] == 'closed'
+                and state['failures'] >= settings.MB_CIRCUIT_FAILURES):
+            state['opened'] = arrow.utcnow().isoformat()
+            logging.getLogger('billing').warning(
+                'Mb host {} circuit opened.'.format(self.host))
+        del state['state']
+        cache.set(self.key, state,
+                  FAILURES_TTL + settings.MB_CIRCUIT_RESET)
+        if self.is_probe:
+            cache.delete(self.probe_key)
+            self.is_probe = False
+
+        hosts = cache.get(HOSTS_KEY) or set()
+        if self.host not in hosts:
+            cache.set(HOSTS_KEY, hosts | {self.host}, None)
+
+
+def get_circuits() -> dict:
+    """
+    Get the states of the failed MB hosts circuits by the host
+    """
+    result = {}
+    for host in sorted(cache.get(HOSTS_KEY) or set()):
+        circuit = HostCircuit('//' + host)
+        state = circuit.get_state()
+        state['in_flight'] = cache.get(circuit.slots_key) or 0
+        state['wait'] = round(circuit.get_wait(), 3)
+        result[host] = state
+    return result
@@ -0,0 +1,152 @@
+"""
+The cache locks for running a single task instance at once
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from functools import wraps
+
+import arrow
+from celery import current_task
+from django.core.cache import cache
+
+# The lock expires after the TTL without the heartbeat (sec)
+LOCK_TTL = 60
+LOCK_KEY = 'task_lock:{}'
+STATE_KEY = 'task_lock:{}:{}'
+
+# The names of the task locks for monitoring
+lock_names = set()
+
+
+class CacheLock(object):
+    """
+    The cache lock with the TTL and the heartbeat
+
+    While the lock is held the heartbeat thread prolongs it,
+    so the lock of the killed process expires after the TTL.
+
+    The lock key holds the owner token, it is added once and only touched
+    by the heartbeat, so a late heartbeat never overwrites the lock of
+    another owner. The lock state is saved by the token.
+    """
+
+    def __init__(self, name: str, ttl: int = LOCK_TTL) -> None:
+        self.name = name
+        self.key = LOCK_KEY.format(name)
+        self.ttl = ttl
+        self.token = uuid.uuid4().hex
+        self.state_key = STATE_KEY.format(name, self.token)
+        self.state = None  # type: dict
+        self._stopped = threading.Event()
+        self._heartbeat = None  # type: threading.Thread
+
+    def _is_owned(self) -> bool:
+        return cache.get(self.key) == self.token
+
+    def acquire(self) -> bool:
+        """
+        Acquire the lock and start the heartbeat
+        """
+        now = arrow.utcnow().isoformat()
+        self.state = {
+            'name': self.name,
+            'token': self.token,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'acquired': now,
+            'heartbeat': now,
+        }
+        if not cache.add(self.key, self.token, self.ttl):
+            return False
+        cache.set(self.state_key, self.state, self.ttl)
+
+        self._stopped.clear()
+        self._heartbeat = threading.Thread(
+            target=self._beat, name='lock-{}'.format(self.name), daemon=True)
+        self._heartbeat.start()
+        return True
+
+    def _beat(self) -> None:
+        while not self._stopped.wait(self.ttl / 3):
+            self.extend()
+
+    def extend(self) -> bool:
+        """
+        Prolong the lock
+        """
+        if not self._is_owned() or not cache.touch(self.key, self.ttl):
+            return False
+        self.state['heartbeat'] = arrow.utcnow().isoformat()
+        cache.set(self.state_key, self.state, self.ttl)
+        return True
+
+    def release(self) -> None:
+        """
+        Stop the heartbeat and release the lock
+        """
+        self._stopped.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+            self._heartbeat = None
+        if self._is_owned():
+            cache.delete(self.key)
+        cache.delete(self.state_key)
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *args) -> None:
+        if self._heartbeat:
+            self.release()
+
+
+def get_locks(names=None) -> dict:
+    """
+    Get the states of the held task locks by the lock name
+    """
+    names = lock_names if names is None else names
+    tokens = cache.get_many([LOCK_KEY.format(n) for n in names])
+    states = cache.get_many([
+        STATE_KEY.format(n, tokens[LOCK_KEY.format(n)]) for n in names
+        if LOCK_KEY.format(n) in tokens
+    ])
+    return {
+        s['name']: {k: v
+                    for k, v in s.items() if k != 'token'}
+        for s in states.values()
+    }
+
+
+def locked_task(name=None, ttl=LOCK_TTL, on_locked='skip', countdown=60):
+    """
+    The decorator running a single instance of the task at once
+
+    The overlapping call is skipped or, if on_locked is 'retry',
+    the task is retried after the countdown. Place it under app.task.
+    """
+
+    def decorator(func):
+        lock_name = name or '{}.{}'.format(func.__module__, func.__name__)
+        lock_names.add(lock_name)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            lock = CacheLock(lock_name, ttl)
+            with lock as acquired:
+                if acquired:
+                    return func(*args, **kwargs)
+
+            logging.getLogger('billing').info(
+                'Task {} is locked by {}.'.format(
+                    lock_name, get_locks([lock_name]).get(lock_name)))
+            if on_locked == 'retry':
+                raise current_task.retry(countdown=countdown)
+            return None
+
+        wrapper.lock_name = lock_name
+        return wrapper
+
+    return decorator
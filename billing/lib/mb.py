@@ -3,15 +3,21 @@ The module for interaction with the maxibooking service by HTTP protocol
 """
 import json
 import logging
-import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
 
 import requests
 from django.conf import settings
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
+from requests.adapters import HTTPAdapter
 
 from clients.models import Client
 
+from .circuit import HostCircuit
 from .conf import get_settings
 from .messengers.mailer import mail_client
 
@@ -36,43 +42,136 @@ def mb_settings(client):
     return get_settings('MB_URLS', client=client)
 
 
-def _request(url, data, error_callback):
+# The keep-alive sessions by the MB host
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# The result of the request rejected by the busy host
+REJECTED = object()
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Get the keep-alive session of the MB host
+    """
+    parts = urlsplit(url)
+    host = '{}://{}'.format(parts.scheme, parts.netloc)
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            session.mount(
+                host,
+                HTTPAdapter(
+                    pool_connections=1, pool_maxsize=settings.MB_POOL_SIZE))
+            _sessions[host] = session
+    return session
+
+
+def get_backoff(retries: int) -> float:
+    """
+    Get the exponential backoff with the full jitter (sec)
+    """
+    return random.uniform(
+        0,
+        min(settings.MB_RETRY_BACKOFF_MAX,
+            settings.MB_RETRY_BACKOFF * 2**retries))
+
+
+def _send(url, data, circuit):
+    """
+    Send a single request to maxibooking
+    Returns None if the request has failed and REJECTED if the host is busy.
+    """
+    logger = logging.getLogger('billing')
+    if not circuit.acquire():
+        logger.info('Mb service host {} is busy. url: {}, data: {}'.format(
+            circuit.host, url, data))
+        return REJECTED
+    try:
+        logger.info('Mb service begin request: url: {}, data: {}'.format(
+            url, data))
+        response = get_session(url).post(
+            url, timeout=settings.MB_TIMEOUT, json=data)
+    except requests.exceptions.RequestException as e:
+        logger.info(
+            'Mb service requests exception: {}. url: {}, data: {}'.format(
+                e, url, data))
+        circuit.failure()
+        return None
+    finally:
+        circuit.release()
+
+    if response.status_code >= 500:
+        circuit.failure()
+    else:
+        circuit.success()
+    if response.status_code != 200:
+        logger.info('Mb service response status: {}. url: {}, data: {}'.format(
+            response.status_code, url, data))
+        return None
+    try:
+        json_response = json.loads(response.content)
+        logger.info('Mb service json response: {}. url: {}, data: {}'.format(
+            json_response, url, data))
+        return json_response
+    except json.decoder.JSONDecodeError:
+        return response
+
+
+def _request(url, data, error_callback, task=None):
     """
     Send request to maxibooking
+
+    If the celery task is provided, the failed request is retried
+    by rescheduling the task with the exponential backoff.
+    Otherwise the request is repeated MB_REQUEST_ATTEMPTS times at once.
+    The requests to the host with the open circuit fail fast. If the circuit
+    has rejected all the attempts, the error callback is not called and
+    None is returned, so the caller can repeat the request later.
     """
     if not url:
         return False
 
-    for i in range(0, 10):
-        try:
-            logging.getLogger('billing').info(
-                'Mb service begin request: url: {}, data: {}'.format(
-                    url, data))
-            response = requests.post(
-                url, timeout=settings.MB_TIMEOUT, json=data)
-            if response.status_code == 200:
-                content = response.content
-                try:
-                    json_response = json.loads(content)
-
-                    logging.getLogger('billing').info(
-                        'Mb service json response: {}. url: {}, data: {}'.
-                        format(json_response, url, data))
-                    return json_response
-                except json.decoder.JSONDecodeError:
-                    return response
-        except requests.exceptions.RequestException as e:
+    circuit = HostCircuit(url)
+    can_retry = task is not None and not task.request.is_eager and \
+        task.request.retries < settings.MB_MAX_RETRIES
+    rejected = True
+    for i in range(1 if can_retry else settings.MB_REQUEST_ATTEMPTS):
+        if not circuit.allow():
             logging.getLogger('billing').info(
-                'Mb service requests exception: {}. url: {}, data: {}'.format(
-                    e, url, data))
-
-        if not getattr(settings, 'TESTS', False):  # pragma: no cover
-            time.sleep(settings.MB_TIMEOUT)
+                'Mb service host {} circuit is open. url: {}, data: {}'.format(
+                    circuit.host, url, data))
+            break
+        response = _send(url, data, circuit)
+        if response is REJECTED:
+            continue
+        if response is not None:
+            return response
+        rejected = False
+
+    if can_retry:
+        raise task.retry(
+            countdown=max(
+                get_backoff(task.request.retries), circuit.get_wait()),
+            max_retries=settings.MB_MAX_RETRIES)
+
+    if rejected:
+        return None
+    error_callback()
+    return False
 
-    else:
-        error_callback()
 
-    return False
+def run_concurrently(calls, concurrency=None) -> list:
+    """
+    Run the blocking calls concurrently in the threads pool
+    The calls must not use the database. Returns the results in the calls
+    order, the first exception of the calls is raised.
+    """
+    concurrency = concurrency or settings.MB_CONCURRENCY
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(call) for call in calls]
+    return [future.result() for future in futures]
 
 
 def client_fixtures(client):
@@ -109,7 +208,7 @@ def client_fixtures(client):
     return response
 
 
-def client_install(client):
+def client_install(client, task=None):
     """
     Client installation
     """
@@ -137,10 +236,31 @@ def client_install(client):
             'results_url': reverse(
                 'client-install-result', args=[client.login])
         },
-        error_callback=_error_callback)
+        error_callback=_error_callback,
+        task=task)
 
 
-def client_cache_invalidate(client):
+def _client_cache_invalidate_kwargs(client) -> dict:
+    """
+    Get the client cache invalidation request arguments
+    """
+
+    def _error_callback():
+        logging.getLogger('billing').error(
+            'Failed client cache invalidation. Id: {}; login: {}'.format(
+                client.id, client.login))
+
+    client_settings = get_parsed_client_urls(client)
+    return {
+        'url': client_settings.get('client_invalidation'),
+        'data': {
+            'token': client_settings['token']
+        },
+        'error_callback': _error_callback,
+    }
+
+
+def client_cache_invalidate(client, task=None):
     """
     Client cache invalidate
     """
@@ -148,20 +268,72 @@ def client_cache_invalidate(client):
         'Begin client cache invalidation task. Id: {}; login: {}'.format(
             client.id, client.login))
 
+    return _request(task=task, **_client_cache_invalidate_kwargs(client))
+
+
+def _clients_cache_invalidate_kwargs(url, token, logins) -> dict:
+    """
+    Get the batched clients cache invalidation request arguments
+    """
+
     def _error_callback():
         logging.getLogger('billing').error(
-            'Failed client cache invalidation. Id: {}; login: {}'.format(
-                client.id, client.login))
+            'Failed clients cache invalidation. Logins: {}'.format(
+                ', '.join(logins)))
+
+    return {
+        'url': url,
+        'data': {
+            'token': token,
+            'clients': logins,
+        },
+        'error_callback': _error_callback,
+    }
 
-    client_settings = get_parsed_client_urls(client)
-    return _request(
-        url=client_settings.get('client_invalidation'),
-        data={'token': client_settings['token']},
-        error_callback=_error_callback,
-    )
 
+def clients_cache_invalidate(clients) -> list:
+    """
+    Invalidate the clients caches concurrently
+    Returns the clients whose caches have not been invalidated.
 
-def client_login_cache_invalidate(client):
+    If the MB host supports the batched invalidation (clients_invalidation
+    in MB_URLS), the clients are invalidated with a request
+    by MB_INVALIDATION_BATCH clients.
+    """
+    calls = []
+    requested = []
+    batches = {}
+    for client in clients:
+        urls = mb_settings(client)
+        if urls.get('clients_invalidation'):
+            batches.setdefault((urls['clients_invalidation'], urls['token']),
+                               []).append(client)
+            continue
+        kwargs = _client_cache_invalidate_kwargs(client)
+        if kwargs['url']:
+            calls.append(partial(_request, **kwargs))
+            requested.append([client])
+
+    size = settings.MB_INVALIDATION_BATCH
+    for (url, token), batch in batches.items():
+        for i in range(0, len(batch), size):
+            chunk = batch[i:i + size]
+            kwargs = _clients_cache_invalidate_kwargs(
+                url, token, [c.login for c in chunk])
+            calls.append(partial(_request, **kwargs))
+            requested.append(chunk)
+
+    logging.getLogger('billing').info(
+        'Begin clients cache invalidation. Requests: {}'.format(len(calls)))
+
+    results = run_concurrently(calls)
+    return [
+        client for result, batch in zip(results, requested) if not result
+        for client in batch
+    ]
+
+
+def client_login_cache_invalidate(client, task=None):
     """
     Invalidate client login/alias cache
     """
@@ -181,7 +353,8 @@ def client_login_cache_invalidate(client):
             'client_login': client.login,
             'token': urls['token']
         },
-        error_callback=_error_callback)
+        error_callback=_error_callback,
+        task=task)
 
 
 def client_archive(client):
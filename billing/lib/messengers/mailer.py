@@ -1,33 +1,122 @@
 import logging
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 
 from django.conf import settings
 from django.core.mail import mail_managers as base_mail_managers
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template, render_to_string
 from django.utils.translation import ugettext_lazy as _
 
 from billing.lib.lang import select_locale
 
+# MailBatch of the current context or None
+current_batch = ContextVar('mail_batch', default=None)
+
+
+class MailBatch(object):
+    """
+    The emails sent over a reused connection in chunks
+    """
+
+    def __init__(self, size: int = None) -> None:
+        self.size = size or settings.EMAIL_BATCH_SIZE
+        self.messages = []  # type: list
+        self.failed = []  # type: list
+
+    def add(self, message: EmailMultiAlternatives) -> None:
+        self.messages.append(message)
+
+    def _send_chunk(self, connection, messages) -> int:
+        sent = 0
+        for message in messages:
+            try:
+                sent += connection.send_messages([message])
+            except Exception as e:
+                logging.getLogger('billing').error(
+                    'Failed to send mail. Subject: {}; email: {}; {}'.format(
+                        message.subject, ', '.join(message.to), e))
+                self.failed.append((message, e))
+                connection.close()
+        return sent
+
+    def send(self) -> int:
+        """
+        Send the emails
+        Returns the number of the sent emails.
+        """
+        sent = 0
+        for i in range(0, len(self.messages), self.size):
+            connection = get_connection()
+            try:
+                connection.open()
+                sent += self._send_chunk(connection,
+                                         self.messages[i:i + self.size])
+            except Exception as e:
+                logging.getLogger('billing').error(
+                    'Failed to open mail connection. {}'.format(e))
+                self.failed.extend(
+                    [(m, e) for m in self.messages[i:i + self.size]])
+            finally:
+                connection.close()
+        self.messages = []
+        logging.getLogger('billing').info(
+            'Mail batch sent. Sent: {}; failed: {}'.format(
+                sent, len(self.failed)))
+
+        return sent
+
+
+@contextmanager
+def mail_batch(size: int = None):
+    """
+    Collect the client emails and send them over a connection at the exit
+    """
+    batch = MailBatch(size)
+    token = current_batch.set(batch)
+    try:
+        yield batch
+    finally:
+        current_batch.reset(token)
+    batch.send()
+
+
+# The paragraphs without the attributes
+PARAGRAPH_RE = re.compile(r'<(p|li)>')
+
+
+@lru_cache(maxsize=None)
+def get_inline_styles() -> str:
+    """
+    Get the rendered paragraph styles
+    """
+    return render_to_string('emails/inline_styles.html')
+
 
 def add_paragraph_styles(email_html: str) -> str:
     """
     Set styles for the email paragraphs
     """
-    styles = render_to_string('emails/inline_styles.html')
-    for elem in ['p', 'li']:
-        email_html = email_html.replace(
-            '<{}>'.format(elem),
-            '<{} {}>'.format(elem, styles),
-        )
-    return email_html
+    styles = get_inline_styles()
+    return PARAGRAPH_RE.sub(lambda m: '<{} {}>'.format(m.group(1), styles),
+                            email_html)
+
+
+def render_email(template: str, data: dict = None) -> str:
+    """
+    Render the email with the paragraph styles
+    """
+    return add_paragraph_styles(
+        get_template(template).render(data if data else {}))
 
 
 def mail_managers(subject, data=None, template='emails/base_manager.html'):
     base_mail_managers(
         subject=subject,
         message='',
-        html_message=add_paragraph_styles(
-            render_to_string(template, data if data else {})))
+        html_message=render_email(template, data))
     logging.getLogger('billing').info(
         'Send mail to managers. Subject: {}'.format(subject))
 
@@ -42,13 +131,20 @@ def mail_client(subject, template, data, email=None, client=None, lang=None):
             subject_text += client.name + ', '
         subject_text += str(_(subject))
 
-        send_mail(
-            recipient_list=[email] if email else [client.email],
-            from_email=settings.DEFAULT_FROM_EMAIL,
+        message = EmailMultiAlternatives(
             subject=subject_text,
-            message='',
-            html_message=add_paragraph_styles(
-                render_to_string(template, data)))
+            body='',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email] if email else [client.email])
+        message.attach_alternative(
+            render_email(template, data),
+            'text/html')
+
+    batch = current_batch.get()
+    if batch is not None:
+        batch.add(message)
+    else:
+        message.send()
 
     logging.getLogger('billing').info(
         'Send mail to client. Subject: {}; client: {}; email: {};'.format(
@@ -0,0 +1,142 @@
+"""
+The transactional outbox of the celery tasks
+
+The tasks are saved to the outbox table in the current transaction and
+published by the relay after the commit, so the rolled back transactions
+publish nothing and the workers read the committed rows. The relay
+publishes the messages in batches in the creation order.
+
+The delivery is at-least-once: a relay failing after the publishing and
+before the commit publishes the messages again. The messages are published
+with the outbox task ids and the tasks decorated with once() skip
+the already completed messages.
+"""
+import logging
+from contextvars import ContextVar
+from functools import wraps
+
+from celery import current_task
+from django.core.cache import cache
+from django.db import transaction
+
+from billing.celery import app
+from billing.models import OutboxMessage
+
+# The number of messages published in a transaction
+BATCH_SIZE = 500
+
+RELAY_PENDING_KEY = 'outbox_relay_pending'
+
+TASK_ID_PREFIX = 'outbox-'
+COMPLETED_KEY = 'outbox_completed_{}'
+
+# The completed messages are remembered for the redeliveries (sec)
+COMPLETED_TTL = 60 * 60 * 24
+
+# Whether the relay is running in the current context
+relaying = ContextVar('outbox_relaying', default=False)
+
+
+def is_eager() -> bool:
+    """
+    Check whether the tasks are executed locally
+    """
+    return app.conf.task_always_eager
+
+
+def enqueue(task, args=(), kwargs=None, **options):
+    """
+    Publish the task after the current transaction commit
+    The task is the task object or name, the options are apply_async ones.
+    """
+    name = getattr(task, 'name', task)
+    message = OutboxMessage.objects.create(
+        task=name, args=list(args), kwargs=kwargs or {}, options=options)
+    transaction.on_commit(schedule_relay)
+
+    # the commit callbacks do not run in the test transactions,
+    # the messages of the eager tasks are published by the running relay
+    if is_eager() and not relaying.get():
+        relay()
+
+    return message
+
+
+def schedule_relay() -> None:
+    """
+    Schedule the relay unless it is already pending
+    """
+    if cache.add(RELAY_PENDING_KEY, True, 60):
+        app.signature('billing.tasks.outbox_relay_task').apply_async()
+
+
+def get_task_id(message) -> str:
+    return '{}{}'.format(TASK_ID_PREFIX, message.pk)
+
+
+def publish(messages) -> None:
+    """
+    Publish the messages with the outbox task ids
+    """
+    signatures = [(app.signature(m.task, m.args, m.kwargs, **m.options),
+                   get_task_id(m)) for m in messages]
+    if is_eager():
+        for signature, task_id in signatures:
+            signature.apply_async(task_id=task_id)
+        return None
+    with app.producer_or_acquire() as producer:
+        for signature, task_id in signatures:
+            signature.apply_async(producer=producer, task_id=task_id)
+
+
+def relay(batch_size=BATCH_SIZE) -> int:
+    """
+    Publish the outbox messages
+    Returns the number of the published messages.
+    """
+    cache.delete(RELAY_PENDING_KEY)
+    published = 0
+    token = relaying.set(True)
+    try:
+        while True:
+            with transaction.atomic():
+                messages = list(OutboxMessage.objects.select_for_update(
+                ).order_by('pk')[:batch_size])
+                if not messages:
+                    break
+                publish(messages)
+                OutboxMessage.objects.filter(
+                    pk__in=[m.pk for m in messages]).delete()
+            published += len(messages)
+    finally:
+        relaying.reset(token)
+
+    if published:
+        logging.getLogger('billing').info(
+            'Outbox messages published: {}.'.format(published))
+
+    return published
+
+
+def once(func):
+    """
+    The decorator skipping the redelivered outbox messages of the task
+    The message is completed when the task returns. Place it under app.task.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        task_id = getattr(getattr(current_task, 'request', None), 'id', None)
+        if not task_id or not task_id.startswith(TASK_ID_PREFIX):
+            return func(*args, **kwargs)
+
+        key = COMPLETED_KEY.format(task_id)
+        if cache.get(key):
+            logging.getLogger('billing').info(
+                'Outbox message {} is already completed.'.format(task_id))
+            return None
+        result = func(*args, **kwargs)
+        cache.set(key, True, COMPLETED_TTL)
+        return result
+
+    return wrapper
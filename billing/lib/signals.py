@@ -0,0 +1,49 @@
+"""
+The signals receivers suppression
+
+The receivers decorated with suppressible(name) do nothing inside
+the suppress_signals(name) context. It is used by the explicit pipelines
+doing the receivers work at once.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# The names of the suppressed receivers of the current context
+suppressed_signals = ContextVar('suppressed_signals', default=frozenset())
+
+
+@contextmanager
+def suppress_signals(*names):
+    """
+    Suppress the receivers with the names
+    """
+    token = suppressed_signals.set(suppressed_signals.get() | set(names))
+    try:
+        yield
+    finally:
+        suppressed_signals.reset(token)
+
+
+def is_suppressed(name: str) -> bool:
+    """
+    Check whether the receivers with the name are suppressed
+    """
+    return name in suppressed_signals.get()
+
+
+def suppressible(name: str):
+    """
+    The decorator skipping the receiver inside suppress_signals(name)
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if is_suppressed(name):
+                return None
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,97 @@
+"""
+The request statistics: SQL queries, cache hits and latency
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+# RequestStats of the current request or None
+request_stats = ContextVar('request_stats', default=None)
+
+
+class RequestStats(object):
+    """
+    The statistics of a single request
+    """
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.latency = 0.0
+
+    def execute(self, execute, sql, params, many, context):
+        """
+        The database execute wrapper
+        """
+        begin = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.monotonic() - begin
+
+    def as_dict(self) -> dict:
+        return {
+            'queries': self.queries,
+            'db_time': round(self.db_time, 6),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'latency': round(self.latency, 6),
+        }
+
+
+def record_cache(hit: bool) -> None:
+    """
+    Record the cache hit or miss in the current request stats
+    """
+    stats = request_stats.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+class StatsRegistry(object):
+    """
+    The in-process aggregated statistics by the URL name
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries = {}  # type: dict
+
+    def add(self, name: str, stats: RequestStats) -> None:
+        with self.lock:
+            entry = self.entries.setdefault(
+                name, {
+                    'requests': 0,
+                    'queries': 0,
+                    'queries_max': 0,
+                    'db_time': 0.0,
+                    'cache_hits': 0,
+                    'cache_misses': 0,
+                    'latency': 0.0,
+                    'latency_max': 0.0,
+                })
+            entry['requests'] += 1
+            entry['queries'] += stats.queries
+            entry['queries_max'] = max(entry['queries_max'], stats.queries)
+            entry['db_time'] += stats.db_time
+            entry['cache_hits'] += stats.cache_hits
+            entry['cache_misses'] += stats.cache_misses
+            entry['latency'] += stats.latency
+            entry['latency_max'] = max(entry['latency_max'], stats.latency)
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {k: dict(v) for k, v in self.entries.items()}
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries = {}
+
+
+registry = StatsRegistry()
@@ -1,3 +1,10 @@
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
 def __check_dict(data, search):
     """
     search dict for value
@@ -26,3 +33,40 @@ def json_contains(response, search, data=None):
     else:
         result = __check_dict(data, search)
     assert result
+
+
+@contextmanager
+def stub_server(status=200, data=None):
+    """
+    Run the local keep-alive HTTP server responding to the POST requests
+    Yields the server URL and the list of the (client address, json) requests.
+    """
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            received.append((self.client_address,
+                             json.loads(self.rfile.read(length) or 'null')))
+            body = json.dumps(data or {'status': True}).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(server.server_port), received
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -2,6 +2,17 @@ from django.conf import settings
 from django.utils import translation
 
 
+def get_field_languages(model, field_name):
+    """
+    Get the languages of the existing translated model fields
+    """
+    fields = set(f.name for f in model._meta.get_fields())
+    return [
+        code for code, title in settings.LANGUAGES
+        if '{}_{}'.format(field_name, code) in fields
+    ]
+
+
 def auto_populate(obj, field_name, value_getter):
     """
     Auto populate translatable fields
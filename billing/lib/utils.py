@@ -1,5 +1,7 @@
 from importlib import import_module
 
+from django.db.models import Case, Value, When
+
 
 def clsfstr(module, name):
     """
@@ -18,3 +20,32 @@ def get_code(code_string):
     if len(parts) == 1:
         parts.append(None)
     return parts
+
+
+def bulk_update(objects, fields, batch_size=500) -> int:
+    """
+    Update the fields of the model instances with a query per batch
+    The instances must be of the same model. Signals are not sent.
+    """
+    objects = list(objects)
+    if not objects:
+        return 0
+    model = type(objects[0])
+    fields = [model._meta.get_field(f) for f in fields]
+    updated = 0
+    for i in range(0, len(objects), batch_size):
+        batch = objects[i:i + batch_size]
+        values = {}
+        for field in fields:
+            values[field.attname] = Case(
+                *[
+                    When(
+                        pk=obj.pk,
+                        then=Value(
+                            getattr(obj, field.attname), output_field=field))
+                    for obj in batch
+                ],
+                output_field=field)
+        updated += model._base_manager.filter(
+            pk__in=[obj.pk for obj in batch]).update(**values)
+    return updated
@@ -0,0 +1,80 @@
+"""
+Command for benchmarking the email rendering
+"""
+import os
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import translation
+
+from billing.lib.messengers.mailer import render_email
+
+TEMPLATES_DIR = os.path.join(settings.BASE_DIR, 'billing/templates/emails')
+
+
+def legacy_render(template, data):
+    """
+    The rendering with the styles template rendered for every email
+    """
+    email_html = render_to_string(template, data)
+    styles = render_to_string('emails/inline_styles.html')
+    for elem in ['p', 'li']:
+        email_html = email_html.replace(
+            '<{}>'.format(elem),
+            '<{} {}>'.format(elem, styles),
+        )
+    return email_html
+
+
+class Command(BaseCommand):
+    """
+    Compare the cached email rendering with the legacy one
+    on the email templates
+    """
+
+    def add_arguments(self, parser):
+        """
+        Parse the command arguments
+        """
+        parser.add_argument('--number', type=int, default=200)
+
+    def handle(self, *args, **options):
+        """
+        Run the benchmark
+        """
+        data = {
+            'login': 'username',
+            'name': 'John Doe',
+            'url': '/user/login',
+            'website': 'website',
+            'password': 'password',
+            'greetings_new': '<p>Greetings</p>',
+        }
+        templates = [
+            'emails/{}'.format(n) for n in sorted(os.listdir(TEMPLATES_DIR))
+            if n != 'inline_styles.html'
+        ]
+        total_legacy = total = 0
+        for lang, _ in settings.LANGUAGES:
+            with translation.override(lang):
+                for template in templates:
+                    if legacy_render(template, data) != render_email(
+                            template, data):
+                        raise ValueError(
+                            'Different output: {}'.format(template))
+                    legacy = timeit.timeit(
+                        lambda: legacy_render(template, data),
+                        number=options['number'])
+                    cached = timeit.timeit(
+                        lambda: render_email(template, data),
+                        number=options['number'])
+                    total_legacy += legacy
+                    total += cached
+                    self.stdout.write('{} {}: {:.4f}s -> {:.4f}s'.format(
+                        lang, template, legacy, cached))
+
+        self.stdout.write(
+            self.style.SUCCESS('Total: {:.4f}s -> {:.4f}s ({:.1f}x)'.format(
+                total_legacy, total, total_legacy / total)))
@@ -1,9 +1,21 @@
-from django.db.models import signals
-from django.urls import resolve
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import Resolver404, resolve
 from django.utils.deprecation import MiddlewareMixin
-from django.utils.functional import curry
 from django.utils.translation import activate
 
+from billing.exceptions import BaseException
+from billing.lib.stats import RequestStats, registry, request_stats
+
+# (user, ) of the current unsafe request or None
+whodid_user = ContextVar('whodid_user', default=None)
+
 
 class DisableAdminI18nMiddleware(MiddlewareMixin):
     def process_request(self, request):
@@ -15,34 +27,99 @@ class DisableAdminI18nMiddleware(MiddlewareMixin):
 class WhodidMiddleware(MiddlewareMixin):
     """
     Fill the created_by and updated_by fields
+    The user is stored in the context variable read by the
+    whodid_pre_save receiver.
     """
 
     def process_request(self, request):
+        whodid = None
         if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
             if hasattr(request, 'user') and request.user.is_authenticated:
-                user = request.user
+                whodid = (request.user, )
             else:
-                user = None
-
-            mark_whodid = curry(self.mark_whodid, user)
-            signals.pre_save.connect(
-                mark_whodid,
-                dispatch_uid=(
-                    self.__class__,
-                    request,
-                ),
-                weak=False)
+                whodid = (None, )
+        whodid_user.set(whodid)
 
     def process_response(self, request, response):
-        signals.pre_save.disconnect(dispatch_uid=(
-            self.__class__,
-            request,
-        ))
+        whodid_user.set(None)
+        return response
+
+
+def mark_whodid(instance):
+    """
+    Fill the created_by and updated_by fields of the instance
+    by the user of the current request
+    """
+    whodid = whodid_user.get()
+    if whodid is None:
+        return None
+    user = whodid[0]
+    if hasattr(instance, 'created_by_id') and not getattr(
+            instance, 'created_by_id', None):
+        instance.created_by = user
+    if hasattr(instance, 'modified_by_id'):
+        instance.modified_by = user
+
+
+class QueryBudgetExceeded(BaseException):
+    """
+    The view has issued more SQL queries than its budget
+    """
+
+
+class QueryStatsMiddleware(object):
+    """
+    Record the SQL queries, the DB time, the cache hits and misses
+    and the latency of the requests by the resolved URL name
+
+    Enabled by the QUERY_STATS_ENABLED setting.
+    The views query budgets are taken from the QUERY_BUDGETS setting.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_STATS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.logger = logging.getLogger('billing')
+
+    @staticmethod
+    def get_name(request) -> str:
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is None:
+            try:
+                resolver_match = resolve(request.path_info)
+            except Resolver404:
+                return 'unknown'
+        return resolver_match.view_name
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        begin = time.monotonic()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.execute))
+                response = self.get_response(request)
+        finally:
+            stats.latency = time.monotonic() - begin
+            request_stats.reset(token)
+
+        name = self.get_name(request)
+        registry.add(name, stats)
+        self.logger.info('Request stats: %s %s %s', request.method, name,
+                         stats.as_dict())
+        self.check_budget(name, stats)
+
         return response
 
-    def mark_whodid(self, user, sender, instance, **kwargs):
-        if hasattr(instance, 'created_by_id') and not getattr(
-                instance, 'created_by_id', None):
-            instance.created_by = user
-        if hasattr(instance, 'modified_by_id'):
-            instance.modified_by = user
+    def check_budget(self, name: str, stats: RequestStats) -> None:
+        budget = settings.QUERY_BUDGETS.get(name)
+        if budget is None or stats.queries <= budget:
+            return None
+        message = 'Query budget exceeded: {} {} > {}'.format(
+            name, stats.queries, budget)
+        if settings.QUERY_BUDGETS_STRICT:
+            raise QueryBudgetExceeded(message)
+        self.logger.warning(message)
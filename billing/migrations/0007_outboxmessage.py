@@ -0,0 +1,29 @@
+# Generated by Django 2.1.7 on 2026-10-18 12:00
+
+import django.contrib.postgres.fields.jsonb
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_auto_20181206_1200'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=255, verbose_name='task')),
+                ('args', django.contrib.postgres.fields.jsonb.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='args')),
+                ('kwargs', django.contrib.postgres.fields.jsonb.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='kwargs')),
+                ('options', django.contrib.postgres.fields.jsonb.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='options')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created')),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+    ]
@@ -3,6 +3,8 @@ from abc import ABCMeta, abstractmethod
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.fields import JSONField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinLengthValidator
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
@@ -191,3 +193,24 @@ class CountryBase(ABCModel):
 
     class Meta:
         abstract = True
+
+
+class OutboxMessage(models.Model):
+    """
+    The celery task published after the transaction commit
+    """
+    task = models.CharField(max_length=255, verbose_name=_('task'))
+    args = JSONField(
+        default=list, encoder=DjangoJSONEncoder, verbose_name=_('args'))
+    kwargs = JSONField(
+        default=dict, encoder=DjangoJSONEncoder, verbose_name=_('kwargs'))
+    options = JSONField(
+        default=dict, encoder=DjangoJSONEncoder, verbose_name=_('options'))
+    created = models.DateTimeField(
+        auto_now_add=True, db_index=True, verbose_name=_('created'))
+
+    def __str__(self):
+        return '{} #{}'.format(self.task, self.pk)
+
+    class Meta:
+        ordering = ['pk']
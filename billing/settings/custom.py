@@ -60,6 +60,40 @@ MB_COUNTRIES_OVERWRITE = ENV.dict('MB_COUNTRIES_OVERWRITE', default={})
 # Requests timeout (sec)
 MB_TIMEOUT = ENV.int('MB_TIMEOUT')
 
+# Immediate request attempts without the task retries
+MB_REQUEST_ATTEMPTS = 3
+
+# Task retries of the failed request with the exponential backoff (sec)
+MB_MAX_RETRIES = 8
+MB_RETRY_BACKOFF = 5
+MB_RETRY_BACKOFF_MAX = 60 * 10
+
+# Keep-alive connections by the MB host
+MB_POOL_SIZE = 10
+
+# Concurrent requests of the fan-out calls
+MB_CONCURRENCY = 20
+
+# In-flight requests by the MB host
+MB_HOST_CONCURRENCY = 10
+
+# The host circuit opens after the consecutive failures
+# and becomes half-open after the reset period (sec)
+MB_CIRCUIT_FAILURES = 5
+MB_CIRCUIT_RESET = 60
+
+# The client cache invalidations are collapsed within the delay (sec)
+MB_INVALIDATION_DELAY = 5
+
+# Clients by the batched invalidation request
+MB_INVALIDATION_BATCH = 100
+
+# The orders notes are rendered on the first read instead of the order save
+MB_ORDER_NOTES_LAZY = ENV.bool('MB_ORDER_NOTES_LAZY', default=False)
+
+# The cached orders notes version, increase it after the translations changes
+MB_ORDER_NOTES_VERSION = 1
+
 # Order expired period (in days)
 MB_ORDER_EXPIRED_DAYS = ENV.int('MB_ORDER_EXPIRED_DAYS')
 
@@ -88,3 +122,20 @@ MB_BILL_RECIPIENT_COMPANY = ENV.dict('MB_BILL_RECIPIENT_COMPANY')
 MB_SITE_URL = 'https://maxi-booking.com'
 MB_TRIAL_DAYS = 15
 MB_WEBSITE_DOMAIN = 'https://{}.maaaxi.com'
+
+# The request stats: SQL queries, cache hits and latency by the URL name
+QUERY_STATS_ENABLED = ENV.bool('QUERY_STATS_ENABLED', default=False)
+
+# The maximum number of SQL queries by the URL name
+# Exceeding raises an exception if QUERY_BUDGETS_STRICT else logs a warning
+QUERY_BUDGETS_STRICT = ENV.bool('QUERY_BUDGETS_STRICT', default=False)
+QUERY_BUDGETS = {
+    'client-list': 30,
+    'client-detail': 30,
+    'order-list': 30,
+    'order-detail': 30,
+    'service-calc': 10,
+    'service-calc-matrix': 10,
+    'admin:clients_client_changelist': 60,
+    'admin:finances_order_changelist': 60,
+}
@@ -100,6 +100,7 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'billing.middleware.QueryStatsMiddleware',
     'django.middleware.gzip.GZipMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -214,6 +215,7 @@ LOCALE_PATHS = (
 )
 
 EMAIL_SUBJECT_PREFIX = 'Maxi-booking: '
+EMAIL_BATCH_SIZE = 50
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 10240
 
 AUTHENTICATION_BACKENDS = ['users.auth_backends.ProxiedModelBackend']
@@ -294,13 +296,21 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Europe/Dublin'
 CELERY_APP = 'billing'
+# The queue of the mail tasks, set a dedicated one only with its worker
+CELERY_MAIL_QUEUE = ENV.str('CELERY_MAIL_QUEUE', default='default')
 CELERY_QUEUES = (
     Queue('default'),
     Queue('priority_high'),
 )
+if CELERY_MAIL_QUEUE not in ('default', 'priority_high'):
+    CELERY_QUEUES += (Queue(CELERY_MAIL_QUEUE), )
 CELERY_DEFAULT_QUEUE = 'default'
 CELERYD_TASK_SOFT_TIME_LIMIT = 60 * 5
 CELERYBEAT_SCHEDULE = {
+    'outbox_relay': {
+        'task': 'billing.tasks.outbox_relay_task',
+        'schedule': 60
+    },
     'client_services_update_task': {
         'task': 'clients.tasks.client_services_update',
         'schedule': 60 * 10
@@ -321,6 +331,10 @@ CELERYBEAT_SCHEDULE = {
         'task': 'finances.tasks.update_exchange_rates_task',
         'schedule': 60 * 60 * 24
     },
+    'restrictions_reconciliation': {
+        'task': 'clients.tasks.restrictions_reconciliation',
+        'schedule': 60 * 60
+    },
     'clients_archivation': {
         'task': 'clients.tasks.clients_archivation',
         'schedule': 60 * 10
@@ -396,7 +410,11 @@ CACHES['default']['TIMEOUT'] = 60 * 60 * 24 * 7
 REST_FRAMEWORK_EXTENSIONS = {
     'DEFAULT_CACHE_RESPONSE_TIMEOUT': 60 * 60 * 24 * 7,
     'DEFAULT_CACHE_ERRORS': False,
-    'DEFAULT_USE_CACHE': 'default'
+    'DEFAULT_USE_CACHE': 'default',
+    'DEFAULT_OBJECT_CACHE_KEY_FUNC':
+    'billing.lib.cache.tagged_object_cache_key_func',
+    'DEFAULT_LIST_CACHE_KEY_FUNC':
+    'billing.lib.cache.tagged_list_cache_key_func',
 }
 
 # View permission
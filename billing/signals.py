@@ -1,22 +1,33 @@
-from django.core.cache import cache
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from djmoney.contrib.exchange.models import Rate
 
 from clients.tasks import mail_managers_task
 
+from .lib import outbox
+from .lib.cache import invalidate_model
+from .middleware import mark_whodid
 from .models import CachedModel, CheckedModel
 
 
+@receiver(pre_save, dispatch_uid='whodid_pre_save')
+def whodid_pre_save(sender, **kwargs):
+    """
+    Fill the created_by and updated_by fields
+    """
+    mark_whodid(kwargs['instance'])
+
+
 @receiver(post_save, dispatch_uid='cached_model_post_save')
+@receiver(post_delete, dispatch_uid='cached_model_post_delete')
 def cached_model_post_save(sender, **kwargs):
     """
-    Cached model post save
+    Cached model post save && delete
+    Invalidate the cache entries tagged with the model or the instance
     """
-    models = (CachedModel, Rate)
-    for model in models:
-        if isinstance(kwargs['instance'], model):
-            cache.clear()
+    instance = kwargs['instance']
+    if isinstance(instance, (CachedModel, Rate)):
+        invalidate_model(instance)
 
 
 @receiver(post_save, dispatch_uid='checked_model_post_save')
@@ -27,10 +38,13 @@ def checked_model_post_save(sender, **kwargs):
     instance = kwargs['instance']
     if isinstance(instance, CheckedModel) and not instance.is_checked:
 
-        mail_managers_task.delay(
-            subject='New object for moderation',
-            data={
-                'text':
-                'New object for moderation: {}, id - {}, info - {}'.format(
-                    instance, instance.pk, instance.__repr__())
+        outbox.enqueue(
+            mail_managers_task,
+            kwargs={
+                'subject': 'New object for moderation',
+                'data': {
+                    'text':
+                    'New object for moderation: {}, id - {}, info - {}'.format(
+                        instance, instance.pk, instance.__repr__())
+                }
             })
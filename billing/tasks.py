@@ -1,3 +1,8 @@
+from celery.exceptions import SoftTimeLimitExceeded
+
+from billing.lib import outbox
+from billing.lib.chunks import jobs
+from billing.lib.locks import locked_task
 from billing.lib.messengers.mailer import mail_client, mail_managers
 
 from .celery import app
@@ -24,3 +29,35 @@ def mail_comments_action_task():
             mail_client(**data)
         else:
             mail_managers(**data)
+
+
+@app.task(bind=True)
+def process_chunk_task(self, name, run_id, index, pk_from, pk_to, args,
+                       kwargs):
+    """
+    Process the chunk of the chunked task
+    The chunk is resumed from the last processed object after
+    the soft time limit.
+    """
+    try:
+        return jobs[name].process_chunk(run_id, index, pk_from, pk_to, args,
+                                        kwargs)
+    except SoftTimeLimitExceeded:
+        raise self.retry(countdown=1)
+
+
+@app.task
+def finish_chunks_task(results, name, run_key, run_id):
+    """
+    Finish the run of the chunked task
+    """
+    jobs[name].finish(run_key, run_id)
+
+
+@app.task(max_retries=None)
+@locked_task(on_locked='retry', countdown=1)
+def outbox_relay_task():
+    """
+    Publish the outbox messages
+    """
+    return outbox.relay()
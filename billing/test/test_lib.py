@@ -1,9 +1,15 @@
 import pytest
+from celery.exceptions import Retry, SoftTimeLimitExceeded
+from django.core.cache import cache
 from django.utils import translation
 
+from billing.lib import cache as cache_lib
 from billing.lib import lang, trans
-from billing.lib.cache import cache_result
-from clients.models import Client
+from billing.lib.cache import (cache_result, get_model_tag, get_or_compute,
+                               invalidate_model)
+from billing.lib.chunks import ChunkedJob, jobs
+from billing.lib.locks import CacheLock, get_locks, locked_task
+from clients.models import Client, ClientWebsite
 from finances.models import Order
 
 pytestmark = pytest.mark.django_db
@@ -65,3 +71,199 @@ def test_cache_result():
 
     assert test_func(1, 2) == 3
     assert test_func.counter == 2
+
+
+def test_cache_result_tags():
+    """
+    Test the cache_result decorator with the model tags
+    """
+
+    @cache_result(tags=(ClientWebsite, ))
+    def test_func(one):
+        """
+        The function to test
+        """
+        test_func.counter += 1
+        return one
+
+    test_func.counter = 0
+    website = ClientWebsite.objects.get(client_id=1)
+
+    assert get_model_tag(website) == 'clients.clientwebsite:{}'.format(
+        website.pk)
+    assert get_model_tag('clients.ClientWebsite') == 'clients.clientwebsite'
+
+    assert test_func(1) == 1
+    assert test_func(1) == 1
+    assert test_func.counter == 1
+
+    Client.objects.get(pk=1).save()
+    assert test_func(1) == 1
+    assert test_func.counter == 1
+
+    website.save()
+    assert test_func(1) == 1
+    assert test_func.counter == 2
+
+    invalidate_model(website)
+    assert test_func(1) == 1
+    assert test_func.counter == 3
+
+
+def test_cache_result_keys():
+    """
+    Test the cache_result keys, invalidation and counters
+    """
+
+    @cache_result(timeout=60, version=2, name='billing.test.keys_func')
+    def test_func(one, two=None):
+        """
+        The function to test
+        """
+        test_func.counter += 1
+        return None
+
+    test_func.counter = 0
+    test_func.invalidate_all()
+    key = test_func.get_key(ClientWebsite.objects, {'b', 'a'}, two=1)
+
+    assert key == test_func.get_key(ClientWebsite.objects, {'a', 'b'}, two=1)
+    assert key != test_func.get_key(ClientWebsite.objects, {'a'}, two=1)
+    assert key.startswith('cache_result:billing.test.keys_func:2:')
+
+    hits = test_func.stats['hits']
+    misses = test_func.stats['misses']
+    assert test_func(1, two=2) is None
+    assert test_func(1, two=2) is None
+    assert test_func.counter == 1
+    assert test_func.stats['hits'] == hits + 1
+    assert test_func.stats['misses'] == misses + 1
+
+    test_func.invalidate(1, two=2)
+    assert test_func(1, two=2) is None
+    assert test_func.counter == 2
+
+    test_func.invalidate_all()
+    assert test_func(1, two=2) is None
+    assert test_func.counter == 3
+
+
+def test_get_or_compute_single_flight(monkeypatch):
+    """
+    Test the single-flight recomputation of the missing keys
+    """
+    monkeypatch.setattr(cache_lib, 'LOCK_WAIT', 0.2)
+    cache.delete_many(['test_single_flight', 'test_single_flight:stale'])
+
+    assert get_or_compute('test_single_flight', lambda: 1,
+                          stale_key='test_single_flight:stale') == 1
+    assert get_or_compute('test_single_flight', lambda: 2) == 1
+
+    # another process is computing the value
+    cache.delete('test_single_flight')
+    cache.add('test_single_flight:lock', 1)
+    assert get_or_compute('test_single_flight', lambda: 3,
+                          stale_key='test_single_flight:stale') == 1
+    assert get_or_compute('test_single_flight', lambda: 4) == 4
+
+    cache.delete('test_single_flight:lock')
+    assert get_or_compute('test_single_flight', lambda: 5) == 4
+    assert get_or_compute('test_single_flight:errors', lambda: 6,
+                          cache_if=lambda v: False) == 6
+    assert cache.get('test_single_flight:errors') is None
+
+
+def test_chunked_job_resume():
+    pks = list(Client.objects.order_by('pk').values_list('pk', flat=True))
+    failed = []
+    processed = []
+
+    def process(client):
+        if client.pk == pks[3] and not failed:
+            failed.append(client.pk)
+            raise SoftTimeLimitExceeded()
+        processed.append(client.pk)
+
+    job = ChunkedJob('test_chunked_job', Client.objects.all, process, 2)
+    jobs[job.name] = job
+    try:
+        with pytest.raises(Retry):
+            job.dispatch((), {})
+        assert processed == pks[:len(processed)]
+        assert len(processed) < len(pks)
+        assert cache.get(job.get_run_key((), {})) is not None
+
+        assert job.dispatch((), {}) > 0
+    finally:
+        del jobs[job.name]
+
+    assert processed == pks
+    assert cache.get(job.get_run_key((), {})) is None
+
+
+def test_chunked_job_failed():
+    pks = list(Client.objects.order_by('pk').values_list('pk', flat=True))
+    failed = []
+    processed = []
+
+    def process(client):
+        if client.pk == pks[3] and not failed:
+            failed.append(client.pk)
+            raise ValueError()
+        processed.append(client.pk)
+
+    job = ChunkedJob('test_chunked_job', Client.objects.all, process, 2)
+    jobs[job.name] = job
+    try:
+        with pytest.raises(ValueError):
+            job.dispatch((), {})
+        assert cache.get(job.get_run_key((), {})) is None
+
+        del processed[:]
+        assert job.dispatch((), {}) == len(job.get_ranges((), {}))
+    finally:
+        del jobs[job.name]
+
+    assert processed == pks
+
+
+def test_locked_task():
+    calls = []
+
+    @locked_task(name='test_locked_task', ttl=3)
+    def task(value):
+        calls.append(value)
+        assert get_locks()['test_locked_task']['pid']
+        return value
+
+    assert task(1) == 1
+    assert get_locks() == {}
+
+    lock = CacheLock('test_locked_task')
+    assert lock.acquire() is True
+    assert CacheLock('test_locked_task').acquire() is False
+    assert task(2) is None
+    assert lock.extend() is True
+    lock.release()
+
+    assert task(3) == 3
+    assert calls == [1, 3]
+
+
+def test_cache_lock_extend_expired():
+    lock = CacheLock('test_cache_lock')
+    assert lock.acquire() is True
+    lock._stopped.set()
+    cache.delete(lock.key)
+
+    other = CacheLock('test_cache_lock')
+    assert other.acquire() is True
+    assert lock.extend() is False
+    assert cache.get(other.key) == other.token
+    assert other.extend() is True
+    assert get_locks(['test_cache_lock'])['test_cache_lock']['pid']
+
+    lock.release()
+    assert cache.get(other.key) == other.token
+    other.release()
+    assert get_locks(['test_cache_lock']) == {}
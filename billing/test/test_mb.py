@@ -1,6 +1,13 @@
+import copy
+from types import SimpleNamespace
+
 import pytest
+from celery.exceptions import Retry
+from django.conf import settings
 
 from billing.lib import mb
+from billing.lib.circuit import HostCircuit, get_circuits, get_host
+from billing.lib.test import stub_server
 from clients.models import Client
 
 pytestmark = pytest.mark.django_db
@@ -20,3 +27,140 @@ def test_get_parsed_client_urls():
     urls = mb.get_parsed_client_urls(client)
     assert urls['install'] == 'http://example.com'
     assert urls['fixtures'] == 'http://google.com/fixtures'
+
+
+class TaskStub(object):
+    """
+    The bound celery task stub
+    """
+
+    def __init__(self, retries=0):
+        self.request = SimpleNamespace(is_eager=False, retries=retries)
+        self.countdown = None
+
+    def retry(self, countdown, max_retries):
+        self.countdown = countdown
+        return Retry()
+
+
+def test_request_keep_alive():
+    with stub_server() as (url, received):
+        for i in range(3):
+            assert mb._request(url + '/', {'id': i}, None) == {'status': True}
+
+    assert [d for _, d in received] == [{'id': 0}, {'id': 1}, {'id': 2}]
+    assert len({address for address, _ in received}) == 1
+    assert mb.get_session(url) is mb.get_session(url + '/other')
+
+
+def test_request_failure(mocker):
+    callback = mocker.Mock()
+    with stub_server(status=500) as (url, received):
+        assert mb._request(url, {'id': 1}, callback) is False
+
+    assert len(received) == settings.MB_REQUEST_ATTEMPTS
+    callback.assert_called_once_with()
+
+
+def test_request_task_retry(mocker):
+    callback = mocker.Mock()
+    task = TaskStub()
+    with stub_server(status=500) as (url, received):
+        with pytest.raises(Retry):
+            mb._request(url, {'id': 1}, callback, task=task)
+
+        task.request.retries = settings.MB_MAX_RETRIES
+        assert mb._request(url, {'id': 1}, callback, task=task) is False
+
+    assert len(received) == 1 + settings.MB_REQUEST_ATTEMPTS
+    assert 0 <= task.countdown <= settings.MB_RETRY_BACKOFF
+    callback.assert_called_once_with()
+
+
+def test_get_backoff():
+    for retries in range(20):
+        assert 0 <= mb.get_backoff(retries) <= min(
+            settings.MB_RETRY_BACKOFF_MAX,
+            settings.MB_RETRY_BACKOFF * 2**retries)
+
+
+def test_clients_cache_invalidate():
+    with stub_server() as (url, received):
+        Client.objects.update(url=url)
+        clients = Client.objects.filter(country__isnull=False)
+        results = mb.clients_cache_invalidate(clients)
+
+    assert results == []
+    assert len(received) == len(clients)
+    assert {d['token'] for _, d in received} == {'token_ru'}
+
+
+def test_request_circuit_open(mocker):
+    callback = mocker.Mock()
+    with stub_server(status=500) as (url, received):
+        assert mb._request(url, {'id': 1}, callback) is False
+        assert mb._request(url, {'id': 2}, callback) is False
+        assert len(received) == settings.MB_CIRCUIT_FAILURES
+        assert mb._request(url, {'id': 3}, callback) is None
+        assert len(received) == settings.MB_CIRCUIT_FAILURES
+
+    assert callback.call_count == 2
+    state = get_circuits()[get_host(url)]
+    assert state['state'] == 'open'
+    assert state['failures'] == settings.MB_CIRCUIT_FAILURES
+    assert state['in_flight'] == 0
+
+
+def test_circuit_half_open(settings):
+    circuit = HostCircuit('http://mb.example.com/invalidate')
+    for i in range(settings.MB_CIRCUIT_FAILURES):
+        assert circuit.allow()
+        circuit.failure()
+    assert circuit.get_state()['state'] == 'open'
+    assert not circuit.allow()
+
+    settings.MB_CIRCUIT_RESET = 0
+    assert circuit.get_state()['state'] == 'half_open'
+    assert circuit.allow()
+    assert not HostCircuit('http://mb.example.com/').allow()
+    circuit.failure()
+    assert circuit.allow()
+    circuit.success()
+    assert circuit.get_state()['state'] == 'closed'
+    assert HostCircuit('http://mb.example.com/').allow()
+
+
+def test_circuit_concurrency(settings):
+    settings.MB_HOST_CONCURRENCY = 2
+    circuit = HostCircuit('http://mb.example.com/')
+    assert circuit.acquire()
+    assert circuit.acquire()
+    assert not circuit.acquire()
+    circuit.release()
+    assert circuit.acquire()
+
+
+def test_clients_cache_invalidate_batched(settings):
+    clients = Client.objects.filter(country__isnull=False)[:3]
+    with stub_server() as (url, received):
+        by_country = copy.deepcopy(settings.MB_SETTINGS_BY_COUNTRY)
+        for urls in by_country['MB_URLS'].values():
+            urls['clients_invalidation'] = url
+        settings.MB_SETTINGS_BY_COUNTRY = by_country
+        settings.MB_INVALIDATION_BATCH = 2
+        results = mb.clients_cache_invalidate(clients)
+
+    assert results == []
+    assert len(received) == 2
+    assert sorted(
+        login for _, d in received
+        for login in d['clients']) == sorted(c.login for c in clients)
+
+
+def test_client_fixtures_circuit_open(mocker, mailoutbox):
+    Client.objects.filter(pk=1).update(url='http://mb.example.com')
+    client = Client.objects.get(pk=1)
+    mocker.patch.object(HostCircuit, 'allow', return_value=False)
+
+    assert mb.client_fixtures(client) is None
+    assert len(mailoutbox) == 0
@@ -1,7 +1,12 @@
 """
 Test suite for the messenger
 """
+from io import StringIO
+from smtplib import SMTPRecipientsRefused
+
 import pytest
+from django.core.mail.backends import locmem
+from django.core.management import call_command
 
 from billing.lib.messengers import mailer
 from clients.models import Client
@@ -120,3 +125,66 @@ def test_mail_client_by_client_subject_format(mailoutbox, settings):
         client=client)
     mail = mailoutbox[1]
     assert mail.subject == 'Prefix: test subject'
+
+
+class FailingBackend(locmem.EmailBackend):
+    """
+    The email backend failing to send to the invalid emails
+    """
+
+    def send_messages(self, messages):
+        for message in messages:
+            if 'invalid' in message.to[0]:
+                raise SMTPRecipientsRefused({message.to[0]: (550, b'')})
+        return super().send_messages(messages)
+
+
+def _send_emails(emails):
+    for email in emails:
+        mailer.mail_client(
+            subject='Text message',
+            template='emails/registration_fail.html',
+            data={},
+            email=email)
+
+
+def test_mail_batch(mailoutbox, mocker, settings):
+    """
+    Should send the batched emails in chunks at the exit
+    """
+    settings.EMAIL_BATCH_SIZE = 2
+    get_connection = mocker.spy(mailer, 'get_connection')
+    emails = ['client{}@example.com'.format(i) for i in range(5)]
+    with mailer.mail_batch() as batch:
+        _send_emails(emails)
+        assert len(mailoutbox) == 0
+
+    assert [m.to[0] for m in mailoutbox] == emails
+    assert get_connection.call_count == 3
+    assert batch.failed == []
+    assert '<p style="font-family:' in mailoutbox[0].alternatives[0][0]
+
+
+def test_mail_batch_failures(mailoutbox, mocker):
+    """
+    Should report the failed emails and send the others
+    """
+    mocker.patch.object(mailer, 'get_connection', FailingBackend)
+    with mailer.mail_batch() as batch:
+        _send_emails(
+            ['one@example.com', 'invalid@example.com', 'two@example.com'])
+
+    assert [m.to[0] for m in mailoutbox] == [
+        'one@example.com', 'two@example.com'
+    ]
+    assert [m.to for m, _ in batch.failed] == [['invalid@example.com']]
+
+
+def test_mail_render_benchmark():
+    """
+    Should render the emails as the legacy rendering
+    """
+    out = StringIO()
+    call_command('mail_render_benchmark', number=1, stdout=out)
+    assert 'emails/registration.html' in out.getvalue()
+    assert 'Total:' in out.getvalue()
@@ -0,0 +1,85 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+
+from billing.lib.stats import registry
+from billing.middleware import (QueryBudgetExceeded, QueryStatsMiddleware,
+                                WhodidMiddleware)
+from clients.models import Client
+
+pytestmark = pytest.mark.django_db
+
+
+def test_whodid_middleware():
+    middleware = WhodidMiddleware()
+    user = User.objects.get(username='admin')
+    client = Client.objects.get(pk=1)
+
+    request = RequestFactory().post('/')
+    request.user = user
+    middleware.process_request(request)
+    client.save()
+    assert client.modified_by == user
+    middleware.process_response(request, HttpResponse())
+
+    client.modified_by = None
+    client.save()
+    assert client.modified_by is None
+
+    request = RequestFactory().get('/')
+    request.user = user
+    middleware.process_request(request)
+    client.save()
+    assert client.modified_by is None
+
+    request = RequestFactory().post('/')
+    request.user = AnonymousUser()
+    client.modified_by = user
+    middleware.process_request(request)
+    client.save()
+    assert client.modified_by is None
+    middleware.process_response(request, HttpResponse())
+
+
+def test_query_stats_middleware(settings):
+    settings.QUERY_STATS_ENABLED = True
+    settings.QUERY_BUDGETS = {'client-list': 2}
+    settings.QUERY_BUDGETS_STRICT = True
+    registry.clear()
+
+    queries = []
+
+    def get_response(request):
+        for _ in range(len(queries)):
+            Client.objects.count()
+        return HttpResponse()
+
+    middleware = QueryStatsMiddleware(get_response)
+    request = RequestFactory().get(reverse('client-list'))
+
+    queries.extend([1, 1])
+    middleware(request)
+    stats = registry.summary()['client-list']
+    assert stats['requests'] == 1
+    assert stats['queries'] == 2
+    assert stats['latency'] > 0
+
+    queries.append(1)
+    with pytest.raises(QueryBudgetExceeded):
+        middleware(request)
+
+    settings.QUERY_BUDGETS_STRICT = False
+    middleware(request)
+    stats = registry.summary()['client-list']
+    assert stats['requests'] == 3
+    assert stats['queries_max'] == 3
+
+
+def test_query_stats_view(client, admin_client):
+    response = client.get(reverse('metrics-queries'))
+    assert response.status_code == 302
+    response = admin_client.get(reverse('metrics-queries'))
+    assert response.status_code == 200
+    assert isinstance(response.json(), dict)
@@ -0,0 +1,77 @@
+import pytest
+from django.db import connection, transaction
+
+from billing.lib import outbox
+from billing.models import OutboxMessage
+from clients.tasks import mail_managers_task
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def lazy_outbox(mocker):
+    mocker.patch('billing.lib.outbox.is_eager', return_value=False)
+
+
+def test_outbox_relay(lazy_outbox, mailoutbox):
+    for subject in ('first', 'second', 'third'):
+        outbox.enqueue(
+            mail_managers_task, kwargs={
+                'subject': subject,
+                'data': {}
+            })
+    assert OutboxMessage.objects.count() == 3
+    assert len(mailoutbox) == 0
+
+    assert outbox.relay(batch_size=2) == 3
+    assert [m.subject.split()[-1] for m in mailoutbox] == [
+        'first', 'second', 'third'
+    ]
+    assert OutboxMessage.objects.count() == 0
+    assert outbox.relay() == 0
+
+
+def test_outbox_rollback(lazy_outbox):
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            outbox.enqueue('clients.tasks.invalidate_mb_client_login_cache',
+                           kwargs={'client_id': 1})
+            raise ValueError()
+
+    assert OutboxMessage.objects.count() == 0
+
+
+def test_outbox_eager(mocker, mailoutbox):
+    relay = mocker.spy(outbox, 'relay')
+    outbox.enqueue(mail_managers_task, ('subject', {}))
+
+    assert relay.call_count == 1
+    assert OutboxMessage.objects.count() == 0
+    assert len(mailoutbox) == 1
+
+
+def test_outbox_commit(lazy_outbox, mocker, mailoutbox):
+    outbox.enqueue(mail_managers_task, ('subject', {}))
+    callbacks = [func for _, func in connection.run_on_commit]
+
+    assert callbacks == [outbox.schedule_relay]
+    assert len(mailoutbox) == 0
+
+    mocker.patch('billing.lib.outbox.is_eager', return_value=True)
+    for func in callbacks:
+        func()
+
+    assert OutboxMessage.objects.count() == 0
+    assert len(mailoutbox) == 1
+
+
+def test_outbox_once(mailoutbox):
+    message = OutboxMessage.objects.create(
+        task=mail_managers_task.name,
+        args=['subject', {}],
+        kwargs={},
+        options={})
+    outbox.publish([message])
+    outbox.publish([message])
+
+    assert len(mailoutbox) == 1
@@ -1,6 +1,7 @@
 import pytest
 
 from billing.lib import utils
+from billing.lib.signals import is_suppressed, suppress_signals, suppressible
 from clients.models import Client
 
 pytestmark = pytest.mark.django_db
@@ -21,3 +22,23 @@ def test_get_code():
 
     with pytest.raises(ValueError):
         a, b = utils.get_code('test~cw~er')
+
+
+def test_suppress_signals():
+    """
+    The suppressible receivers should do nothing in the context
+    """
+    calls = []
+
+    @suppressible('test')
+    def receiver(**kwargs):
+        calls.append(kwargs)
+        return True
+
+    with suppress_signals('test'):
+        assert receiver(sender=None) is None
+        with suppress_signals('other'):
+            assert is_suppressed('test')
+    assert not is_suppressed('test')
+    assert receiver(sender=None) is True
+    assert calls == [{'sender': None}]
@@ -31,3 +31,19 @@ def test_main_view_by_admin_ru(admin_client, settings):
     json_contains(response, '/ru/countries')
     json_contains(response, '/ru/regions')
     json_contains(response, '/ru/cities')
+
+
+def test_task_locks_view(client, admin_client):
+    response = client.get(reverse('metrics-locks'))
+    assert response.status_code == 302
+    response = admin_client.get(reverse('metrics-locks'))
+    assert response.status_code == 200
+    assert response.json() == {}
+
+
+def test_mb_circuits_view(client, admin_client):
+    response = client.get(reverse('metrics-circuits'))
+    assert response.status_code == 302
+    response = admin_client.get(reverse('metrics-circuits'))
+    assert response.status_code == 200
+    assert response.json() == {}
@@ -16,6 +16,7 @@ from fms.urls import router as fms_router
 from hotels.urls import router as hotels_router
 
 from .routers import DefaultRouter
+from .views import mb_circuits, query_stats, task_locks
 
 router = DefaultRouter()
 router.extend(hotels_router, clients_router, finances_router, fms_router)
@@ -23,6 +24,9 @@ router.extend(hotels_router, clients_router, finances_router, fms_router)
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^rosetta/', include('rosetta.urls')),
+    url(r'^metrics/queries$', query_stats, name='metrics-queries'),
+    url(r'^metrics/locks$', task_locks, name='metrics-locks'),
+    url(r'^metrics/circuits$', mb_circuits, name='metrics-circuits'),
     url(r'', include(two_factor_urls)),
 ]
 
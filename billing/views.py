@@ -0,0 +1,30 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+
+from billing.lib.circuit import get_circuits
+from billing.lib.locks import get_locks
+from billing.lib.stats import registry
+
+
+@staff_member_required
+def query_stats(request):
+    """
+    The process request stats by the URL name
+    """
+    return JsonResponse(registry.summary())
+
+
+@staff_member_required
+def task_locks(request):
+    """
+    The held task locks
+    """
+    return JsonResponse(get_locks())
+
+
+@staff_member_required
+def mb_circuits(request):
+    """
+    The MB hosts circuits states
+    """
+    return JsonResponse(get_circuits())
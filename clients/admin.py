@@ -130,6 +130,12 @@ class ClientServiceAdmin(ChangePermissionMixin, VersionAdmin, AjaxSelectAdmin):
         'service': 'services',
     })
 
+    def save_model(self, request, obj, form, change):
+        """
+        Save the client service with the price recalculated
+        """
+        obj.save(recalc=True)
+
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
         if not obj:
@@ -317,8 +323,8 @@ class ClientAdmin(
                      'manager__last_name')
     raw_id_fields = ('country', 'region', 'city')
     readonly_fields = [
-        'info', 'timezone', 'disabled_at', 'created', 'modified', 'created_by',
-        'modified_by', 'managers_history'
+        'info', 'timezone', 'disabled_at', 'first_paid_at', 'created',
+        'modified', 'created_by', 'modified_by', 'managers_history'
     ]
     tab_client = (
         ('General', {
@@ -332,8 +338,8 @@ class ClientAdmin(
         ('Options', {
             'fields': [
                 'status', 'installation', 'trial_activated', 'url',
-                'disabled_at', 'ip', 'created', 'modified', 'created_by',
-                'modified_by'
+                'disabled_at', 'first_paid_at', 'ip', 'created', 'modified',
+                'created_by', 'modified_by'
             ]
         }),
     )
@@ -451,7 +457,11 @@ class='color'>&nbsp;</span><br> {}
             if _check(obj):
                 obj.delete()
         for instance in instances:
-            if _check(instance):
+            if not _check(instance):
+                continue
+            if isinstance(instance, ClientService):
+                instance.save(recalc=True)
+            else:
                 instance.save()
         formset.save_m2m()
 
@@ -1,17 +1,129 @@
 """
 The Clients CORS module
 """
-from corsheaders.middleware import CorsMiddleware
+import re
+import uuid
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from corsheaders.conf import conf
+from django.core.cache import cache
+from django.db import transaction
 
 from clients.models import ClientWebsite
 
 
+def normalize_host(host: str) -> str:
+    """
+    Get the host without the scheme, port and www prefix
+    """
+    host = urlsplit(host if '//' in host else '//' + host).netloc
+    host = host.split(':')[0].strip().lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+@lru_cache(maxsize=8)
+def _compile_whitelist(patterns: tuple) -> list:
+    return [re.compile(p) for p in patterns]
+
+
+def regex_domain_match(host: str) -> bool:
+    """
+    Check if the host matches the CORS regex whitelist
+    """
+    patterns = _compile_whitelist(tuple(conf.CORS_ORIGIN_REGEX_WHITELIST))
+    return any(p.match(host) for p in patterns)
+
+
+class OwnDomainIndex(object):
+    """
+    The in-process index of the enabled client websites with own domains
+
+    The index is loaded once and updated by the ClientWebsite signals.
+    Other processes reload it when the version in the shared cache changes
+    after the commit. The uncommitted changes of the rolled back
+    transactions are discarded by reloading the index.
+    """
+    version_key = 'clients_own_domain_index_version'
+
+    def __init__(self) -> None:
+        self.version = None  # type: str
+        self.hosts = {}  # type: dict
+        self.domains = frozenset()  # type: frozenset
+        self.dirty = False
+
+    def _get_version(self) -> str:
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def _bump_version(self) -> None:
+        self.version = uuid.uuid4().hex
+        cache.set(self.version_key, self.version, None)
+
+    def _is_loaded(self) -> bool:
+        if self.dirty and not transaction.get_connection().in_atomic_block:
+            # the transaction is over without the commit callback
+            self.dirty = False
+            return False
+        return self.version is not None and \
+            self.version == self._get_version()
+
+    def _commit(self) -> None:
+        self.dirty = False
+        self._bump_version()
+
+    def _set_hosts(self, hosts: dict) -> None:
+        self.hosts = hosts
+        self.domains = frozenset(hosts.values())
+
+    def load(self) -> None:
+        """
+        Load the index from the database
+        """
+        version = self._get_version()
+        websites = ClientWebsite.objects.filter(
+            is_enabled=True, own_domain_name=True).values_list('pk', 'url')
+        self._set_hosts({pk: normalize_host(url) for pk, url in websites})
+        self.version = version
+
+    def update(self, website, deleted=False) -> None:
+        """
+        Update the index with the saved or deleted website
+        """
+        if not self._is_loaded():
+            self.load()
+        hosts = dict(self.hosts)
+        hosts.pop(website.pk, None)
+        if not deleted and website.is_enabled and website.own_domain_name:
+            hosts[website.pk] = normalize_host(website.url)
+        self._set_hosts(hosts)
+
+        # the other processes reload the index after the commit
+        self.dirty = True
+        transaction.on_commit(self._commit)
+
+    def reset(self) -> None:
+        self.version = None
+        self.dirty = False
+        self._set_hosts({})
+
+    def __contains__(self, host: str) -> bool:
+        if not self._is_loaded():
+            self.load()
+        return normalize_host(host) in self.domains
+
+
+own_domains = OwnDomainIndex()
+
+
 def check_host(host: str) -> bool:
     """
     Check if the host is allowed
     """
-    middleware = CorsMiddleware()
-    if middleware.regex_domain_match(host):
+    if regex_domain_match(host):
         return True
 
-    return ClientWebsite.objects.check_by_own_domain(host)
+    return host in own_domains
@@ -0,0 +1,101 @@
+"""
+The debounced MB clients cache invalidation
+
+The invalidated clients are appended to the queue in the cache.
+A client is queued once until the queue is flushed, the flush task runs
+MB_INVALIDATION_DELAY seconds after the first queued client, so
+the repeated invalidations are collapsed into a single MB request.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from billing.lib import outbox
+
+CLIENT_KEY = 'mb_invalidation:client:{}'
+ENTRY_KEY = 'mb_invalidation:entry:{}'
+LAST_KEY = 'mb_invalidation:last'
+DONE_KEY = 'mb_invalidation:done'
+SCHEDULED_KEY = 'mb_invalidation:scheduled'
+ATTEMPTS_KEY = 'mb_invalidation:attempts:{}'
+
+# The queued entries expire if the flush task is lost (sec)
+ENTRY_TTL = 60 * 60
+
+
+def schedule(client_id: int) -> bool:
+    """
+    Queue the client cache invalidation
+    Returns False if the client is already queued.
+    """
+    if not cache.add(CLIENT_KEY.format(client_id), True, ENTRY_TTL):
+        return False
+    cache.add(LAST_KEY, 0, None)
+    index = cache.incr(LAST_KEY)
+    cache.set(ENTRY_KEY.format(index), client_id, ENTRY_TTL)
+
+    # the entry range has been claimed by the running flush
+    if (cache.get(DONE_KEY) or 0) >= index:
+        cache.delete(CLIENT_KEY.format(client_id))
+        outbox.enqueue(
+            'clients.tasks.invalidate_client_cache_task',
+            kwargs={'client_id': client_id})
+        return True
+
+    if cache.add(SCHEDULED_KEY, True, settings.MB_INVALIDATION_DELAY * 10):
+        outbox.enqueue(
+            'clients.tasks.flush_clients_cache_invalidation',
+            countdown=settings.MB_INVALIDATION_DELAY)
+    return True
+
+
+def flush() -> list:
+    """
+    Get the queued clients ids and clear the queue
+    """
+    cache.delete(SCHEDULED_KEY)
+    last = cache.get(LAST_KEY) or 0
+    done = cache.get(DONE_KEY) or 0
+    if done > last:
+        done = 0
+    cache.set(DONE_KEY, last, None)
+
+    keys = [ENTRY_KEY.format(i) for i in range(done + 1, last + 1)]
+    ids = sorted(set(cache.get_many(keys).values()))
+    cache.delete_many(keys + [CLIENT_KEY.format(i) for i in ids])
+
+    logging.getLogger('billing').info(
+        'Clients cache invalidation queue flushed. Clients: {}'.format(
+            len(ids)))
+
+    return ids
+
+
+def retry(client_ids) -> list:
+    """
+    Queue the failed clients cache invalidations again
+    Returns the queued clients ids, the clients failed MB_MAX_RETRIES times
+    are dropped.
+    """
+    queued = []
+    for client_id in client_ids:
+        key = ATTEMPTS_KEY.format(client_id)
+        cache.add(key, 0, ENTRY_TTL)
+        if cache.incr(key) > settings.MB_MAX_RETRIES:
+            cache.delete(key)
+            logging.getLogger('billing').error(
+                'Client {} cache invalidation attempts exceeded.'.format(
+                    client_id))
+            continue
+        schedule(client_id)
+        queued.append(client_id)
+
+    return queued
+
+
+def complete(client_ids) -> None:
+    """
+    Reset the failed attempts of the invalidated clients
+    """
+    cache.delete_many([ATTEMPTS_KEY.format(i) for i in client_ids])
@@ -0,0 +1,178 @@
+"""
+The orders generation for the ended client services
+"""
+import logging
+from functools import reduce
+from itertools import groupby
+from operator import or_
+
+import arrow
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, Q
+
+from billing.lib import outbox
+from billing.lib.utils import bulk_update
+from finances.lib import notes
+from finances.lib.calc import BulkCalc
+from finances.models import Order
+from finances.tasks import order_notify_task
+
+from ..models import ClientService
+
+# The number of clients processed in a single transaction
+CHUNK_SIZE = 500
+
+
+class OrdersGenerator(object):
+    """
+    Generate the orders for the ended client services
+
+    The services are grouped by the client, the clients are processed
+    in chunks, each chunk in a single transaction. The result is the same as
+    saving the services and adding them to the client order one by one.
+    """
+
+    def __init__(self, client_services, chunk_size=CHUNK_SIZE) -> None:
+        self.client_services = client_services
+        self.chunk_size = chunk_size
+        self.logger = logging.getLogger('billing')
+
+    def _get_chunks(self):
+        chunk = []
+        services = self.client_services
+        if hasattr(services, 'iterator'):
+            services = services.iterator()
+        for _, group in groupby(services, lambda s: s.client_id):
+            chunk.append(list(group))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _update_services(self, services) -> None:
+        """
+        Update the services ends, prices and statuses
+        """
+        for client_service in services:
+            self.logger.info('Generating order for client service {}'.format(
+                client_service))
+            if client_service.status != 'next':
+                client_service.end = client_service.service.get_default_end(
+                    client_service.end)
+            client_service.is_paid = False
+        for client_service, price in BulkCalc(services).calc().items():
+            client_service.price = price
+
+        # the last saved service of the type stays enabled,
+        # an active service archives the services of the type saved before
+        by_type = {}
+        for client_service in services:
+            by_type.setdefault(
+                (client_service.client_id, client_service.service.type),
+                []).append(client_service)
+        active_types = []
+        for key, entries in by_type.items():
+            is_active = False
+            for client_service in reversed(entries):
+                client_service.is_enabled = client_service is entries[-1]
+                if is_active:
+                    client_service.status = 'archive'
+                is_active = is_active or client_service.status == 'active'
+            if is_active:
+                active_types.append(key)
+
+        bulk_update(services, ('end', 'price', 'price_currency', 'is_paid',
+                               'is_enabled', 'status'))
+
+        def by_client_type(keys):
+            return reduce(or_, [
+                Q(client_id=client_id, service__type=service_type)
+                for client_id, service_type in keys
+            ])
+
+        others = ClientService.objects.exclude(
+            pk__in=[s.pk for s in services])
+        others.filter(by_client_type(by_type.keys())).update(is_enabled=False)
+        if active_types:
+            others.filter(by_client_type(active_types)).update(
+                status='archive')
+
+    @staticmethod
+    def _make_order(group):
+        """
+        Make the unsaved client order
+        Returns the order and whether its new rooms orders should be canceled.
+        """
+        order = Order(client=group[0].client)
+        order.expired_date = arrow.utcnow().shift(
+            days=+settings.MB_ORDER_EXPIRED_DAYS).datetime
+
+        return order, order.calculate(group)
+
+    def _create_orders(self, groups) -> list:
+        """
+        Create the orders and add the client services to them
+        """
+        orders = []
+        cancel_clients = []
+        for group in groups:
+            order, cancel_rooms = self._make_order(group)
+            orders.append(order)
+            if cancel_rooms:
+                cancel_clients.append(order.client_id)
+
+        if cancel_clients:
+            Order.objects.filter(
+                client_id__in=cancel_clients,
+                status='new',
+                client_services__service__type='rooms').update(
+                    status='canceled')
+
+        Order.objects.bulk_create(orders)
+        through = ClientService.orders.through
+        through.objects.bulk_create([
+            through(order_id=order.pk, clientservice_id=client_service.pk)
+            for order, group in zip(orders, groups)
+            for client_service in group
+        ])
+
+        orders_notes = Order.objects.filter(
+            pk__in=[o.pk for o in orders]).select_related(
+                'client').prefetch_related(
+                    Prefetch(
+                        'client_services',
+                        queryset=ClientService.objects.select_related(
+                            'service')))
+        note_fields = [
+            f.name for f in Order._meta.fields
+            if f.name == 'note' or f.name.startswith('note_')
+        ]
+        for order in orders_notes:
+            notes.update(order)
+        bulk_update(orders_notes, note_fields)
+
+        for order in orders:
+            if order.status == 'corrupted':
+                self.logger.error('Order corrupted #{}.'.format(order.pk))
+
+        return orders
+
+    def generate(self) -> list:
+        """
+        Generate the orders
+        """
+        orders = []
+        for groups in self._get_chunks():
+            with transaction.atomic():
+                self._update_services([s for g in groups for s in g])
+                for group in groups:
+                    group[0].client.restrictions_update()
+                chunk_orders = self._create_orders(groups)
+                for order in chunk_orders:
+                    outbox.enqueue(order_notify_task, (order.id, ),
+                                   countdown=1)
+            orders.extend(chunk_orders)
+
+        return orders
@@ -0,0 +1,107 @@
+"""
+The unit of work of the client services updates
+
+The client restrictions rooms limit is maintained incrementally by
+the changes of the saved client services. The services saved in the batch
+collect the rooms changes, the restrictions are updated once per client
+at the exit of the outermost batch block. Only the restrictions updates are
+deferred, the other services are disabled and deactivated by every save.
+The batch runs in an atomic block, so the flush happens inside
+the enclosing transaction, before its commit.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce, Greatest
+
+# ServicesBatch of the current context or None
+current_batch = ContextVar('services_batch', default=None)
+
+
+def update_rooms(client, rooms: int) -> None:
+    """
+    Add the rooms to the client rooms limit
+    The uncalculated limit is calculated from scratch.
+    """
+    restrictions_model = client._meta.get_field('restrictions').related_model
+    updated = restrictions_model.objects.filter(
+        client_id=client.pk, rooms_limit__isnull=False).update(
+            rooms_limit=Greatest(Coalesce(F('rooms_limit'), 0) + rooms, 0))
+    if not updated:
+        client.restrictions_update()
+    elif type(client).restrictions.is_cached(client):
+        client.restrictions.refresh_from_db(fields=['rooms_limit'])
+
+
+def remove_rooms(client_model, client_id, rooms: int) -> None:
+    """
+    Remove the rooms of the deleted service from the client rooms limit
+    The uncalculated limit is left to the next calculation, the client may
+    be deleted too.
+    """
+    if not rooms:
+        return None
+    restrictions_model = client_model._meta.get_field(
+        'restrictions').related_model
+    restrictions_model.objects.filter(
+        client_id=client_id, rooms_limit__isnull=False).update(
+            rooms_limit=Greatest(F('rooms_limit') - rooms, 0))
+
+
+class ServicesBatch(object):
+    """
+    The rooms changes of the clients
+    """
+
+    def __init__(self) -> None:
+        self.rooms = {}  # type: dict
+
+    def add_rooms(self, client, rooms: int) -> None:
+        entry = self.rooms.setdefault(client.pk, [client, 0])
+        entry[1] += rooms
+
+    def flush(self) -> None:
+        """
+        Update the clients restrictions
+        """
+        rooms, self.rooms = self.rooms, {}
+        for client, number in rooms.values():
+            if number:
+                update_rooms(client, number)
+
+
+@contextmanager
+def services_batch():
+    """
+    Save the client services in an atomic block and update the clients
+    restrictions at the exit of it
+    """
+    batch = current_batch.get()
+    if batch is not None:
+        yield batch
+        return
+
+    batch = ServicesBatch()
+    token = current_batch.set(batch)
+    try:
+        with transaction.atomic():
+            yield batch
+            batch.flush()
+    finally:
+        current_batch.reset(token)
+
+
+def add_rooms(client, rooms: int) -> None:
+    """
+    Add the rooms to the client rooms limit now or at the end of
+    the current batch
+    """
+    if not rooms:
+        return None
+    batch = current_batch.get()
+    if batch is not None:
+        batch.add_rooms(client, rooms)
+    else:
+        update_rooms(client, rooms)
@@ -0,0 +1,40 @@
+"""
+Command for re-syncing the clients first paid order dates
+with the orders (e.g. after the orders queryset updates)
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from clients.models import Client
+
+
+class Command(BaseCommand):
+    """
+    Update the clients first paid order dates from the paid orders
+    """
+
+    def add_arguments(self, parser):
+        """
+        Parse the command arguments
+        """
+        parser.add_argument(
+            '--chunk',
+            type=int,
+            default=1000,
+            help='The number of clients updated in a transaction')
+
+    def handle(self, *args, **options):
+        """
+        Run the backfill
+        """
+        pks = list(Client.objects.order_by('pk').values_list('pk', flat=True))
+        size = options['chunk']
+        for i in range(0, len(pks), size):
+            with transaction.atomic():
+                Client.objects.update_first_paid(
+                    Client.objects.filter(pk__in=pks[i:i + size]))
+
+        self.stdout.write(
+            self.style.SUCCESS('Clients updated: {}, paid: {}'.format(
+                len(pks),
+                Client.objects.get_by_orders(True).count())))
@@ -0,0 +1,35 @@
+"""
+Command for reporting the clients rooms limits drift
+"""
+from django.core.management.base import BaseCommand
+
+from clients.models import Client
+
+
+class Command(BaseCommand):
+    """
+    Report the clients with the rooms limit differing from the rooms count
+    """
+
+    def add_arguments(self, parser):
+        """
+        Parse the command arguments
+        """
+        parser.add_argument(
+            '--fix', action='store_true', help='Fix the rooms limits')
+
+    def handle(self, *args, **options):
+        """
+        Report the drift
+        """
+        clients = list(Client.objects.get_rooms_drift())
+        for client in clients:
+            self.stdout.write('{} #{}: rooms limit {}, rooms {}'.format(
+                client.login, client.pk, client.restrictions.rooms_limit,
+                client.rooms))
+            if options['fix']:
+                client.restrictions_update(rooms=client.rooms)
+
+        self.stdout.write(
+            self.style.SUCCESS('Clients with the drift: {}{}'.format(
+                len(clients), ' (fixed)' if options['fix'] else '')))
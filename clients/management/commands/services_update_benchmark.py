@@ -0,0 +1,93 @@
+"""
+Command for benchmarking the client services update
+"""
+import time
+from itertools import cycle
+
+import arrow
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from billing.lib.stats import RequestStats
+from clients.lib.orders import OrdersGenerator
+from clients.models import Client, ClientService
+from finances.lib.calc import Calc
+from finances.models import Service
+
+
+class Command(BaseCommand):
+    """
+    Generate the orders for the fake ended client services and
+    roll back the changes
+    """
+
+    def add_arguments(self, parser):
+        """
+        Parse the command arguments
+        """
+        parser.add_argument('--services', type=int, default=50000)
+        parser.add_argument('--per-client', type=int, default=2)
+
+    @staticmethod
+    def _make_services(number, per_client):
+        """
+        Create the fake ended client services
+        """
+        services = [
+            s for s in Service.objects.filter(is_enabled=True, period__gt=0)
+            if s.prices.count()
+        ]
+        if not services:
+            raise ValueError('Services with prices not found')
+        template = Client.objects.filter(country__isnull=False).first()
+        clients = Client.objects.bulk_create([
+            Client(
+                login='benchmark-{}'.format(i),
+                email='benchmark-{}@example.com'.format(i),
+                name='benchmark {}'.format(i),
+                country_id=template.country_id,
+                status='active',
+            ) for i in range(number // per_client + 1)
+        ])
+        end = arrow.utcnow().shift(days=+1)
+        prices = {}
+        entries = []
+        for i, service in zip(range(number), cycle(services)):
+            client = clients[i // per_client]
+            entry = ClientService(
+                client=client,
+                service=service,
+                country_id=client.country_id,
+                quantity=i % 10 + 1,
+                begin=end.shift(months=-1).datetime,
+                end=end.datetime,
+                status='active',
+                is_paid=True,
+            )
+            key = (service.pk, entry.quantity)
+            if key not in prices:
+                prices[key] = Calc.factory(service).calc(
+                    entry.quantity, template.country)
+            entry.price = prices[key]
+            entries.append(entry)
+        ClientService.objects.bulk_create(entries, batch_size=1000)
+
+    def handle(self, *args, **options):
+        """
+        Run the benchmark
+        """
+        stats = RequestStats()
+        with transaction.atomic():
+            self._make_services(options['services'], options['per_client'])
+            begin = time.monotonic()
+            with connection.execute_wrapper(stats.execute):
+                orders = OrdersGenerator(
+                    ClientService.objects.find_for_orders()).generate()
+            stats.latency = time.monotonic() - begin
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Orders: {}, time: {:.2f}s, queries: {}, DB time: {:.2f}s'.
+                format(len(orders), stats.latency, stats.queries,
+                       stats.db_time)))
@@ -2,11 +2,13 @@ import arrow
 from django.apps import apps
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db.models import Case, Count, IntegerField, Q, Sum, When
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 
 from billing.exceptions import BaseException
 from billing.lib.cache import cache_result
 from billing.managers import DepartmentMixin, LookupMixin
+from finances.lib.calc import BulkCalc
 from hotels.models import Room
 
 
@@ -18,7 +20,7 @@ class ClientWebsiteManager(LookupMixin):
     lookup_search_fields = ('id', 'client__login', 'client__email',
                             'client__name', 'url')
 
-    @cache_result
+    @cache_result(tags=('clients.ClientWebsite', ))
     def check_by_own_domain(self, host: str) -> bool:
         """
         Check if there is a client website with its own domain
@@ -110,14 +112,7 @@ class ClientManager(LookupMixin, DepartmentMixin):
         """
         query = query if query else self.all()
 
-        query = query.annotate()
-
-        return query.filter(
-            status='active', ).prefetch_related('orders').annotate(
-                orders_count=Count(
-                    Case(
-                        When(orders__status='paid', then=1),
-                        output_field=IntegerField()))).filter(orders_count=0)
+        return query.filter(status='active', first_paid_at__isnull=True)
 
     def get_disabled(self,
                      days=settings.MB_CLIENT_DISABLED_FIRST_EMAIL_DAYS,
@@ -158,21 +153,48 @@ class ClientManager(LookupMixin, DepartmentMixin):
 
         return int(rooms or 0)
 
+    def get_rooms_drift(self):
+        """
+        Get the clients with the rooms limit differing from the rooms count
+        The rooms count is annotated as the rooms attribute.
+        """
+        now = arrow.utcnow().datetime
+        return self.annotate(
+            rooms=Coalesce(
+                Sum('services__quantity',
+                    filter=Q(
+                        services__service__type='rooms',
+                        services__begin__lte=now,
+                        services__status='active',
+                    )), 0)).exclude(
+                        restrictions__rooms_limit=F('rooms')).select_related(
+                            'restrictions').order_by('pk')
+
     def get_by_orders(self, paid, query=None):
         """
         Get clients by orders
         """
         query = query if query else self.all()
-        query = query.annotate(
-            orders_count=Count(
-                Case(
-                    When(orders__status='paid', then=1),
-                    output_field=IntegerField())))
-        if paid:
-            query = query.filter(orders_count__gte=1)
-        else:
-            query = query.filter(orders_count=0)
-        return query
+        return query.filter(first_paid_at__isnull=not paid)
+
+    def set_paid(self, pk, paid_at):
+        """
+        Set the client first paid order date unless it is earlier
+        """
+        return self.filter(
+            Q(first_paid_at__isnull=True) | Q(first_paid_at__gt=paid_at),
+            pk=pk).update(first_paid_at=paid_at)
+
+    def update_first_paid(self, query=None):
+        """
+        Update the clients first paid order dates from the orders
+        """
+        query = query if query is not None else self.all()
+        orders = apps.get_model('finances', 'Order').objects.filter(
+            client_id=OuterRef('pk'), status='paid').annotate(
+                paid_at=Coalesce('paid_date', 'created')).order_by('paid_at')
+        return query.update(
+            first_paid_at=Subquery(orders.values('paid_at')[:1]))
 
 
 class ClientServiceManager(LookupMixin, DepartmentMixin):
@@ -265,6 +287,19 @@ class ClientServiceManager(LookupMixin, DepartmentMixin):
             query = query.exclude(pk=exclude_pk)
         return query.update(is_enabled=False)
 
+    def sum_rooms(self, client, exclude_pk=None) -> int:
+        """
+        Sum the rooms of the active client rooms services
+        """
+        query = self.filter(
+            client=client,
+            service__type='rooms',
+            begin__lte=arrow.utcnow().datetime,
+            status='active')
+        if exclude_pk:
+            query = query.exclude(pk=exclude_pk)
+        return int(query.aggregate(Sum('quantity'))['quantity__sum'] or 0)
+
     def deactivate(self, client, service_type=None, exclude_pk=None):
         """
         Deactivate client services by params
@@ -287,6 +322,13 @@ class ClientServiceManager(LookupMixin, DepartmentMixin):
             total += s.price
         return total if total else 0
 
+    def calc_prices(self, query=None):
+        """
+        Calculate the client services prices at once (client service => price)
+        """
+        query = query if query is not None else self.all()
+        return BulkCalc(query).calc()
+
     def find_ended(self):
         """
         Find ended client services
@@ -306,6 +348,17 @@ class ClientServiceManager(LookupMixin, DepartmentMixin):
         ).select_related('client').prefetch_related('orders').order_by(
             'client', '-created')
 
+    def find_for_orders(self):
+        """
+        Find ended client services without new or processing orders
+        """
+        return self.find_ended().prefetch_related(None).annotate(
+            pending_orders_count=Count(
+                'orders',
+                filter=Q(orders__status__in=('new', 'processing')),
+            )).filter(pending_orders_count=0).select_related(
+                'service', 'client__discount', 'client__restrictions')
+
     def find_for_activation(self):
         """
         Find client sevices for activation
@@ -0,0 +1,35 @@
+# Generated by Django 2.1.7 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_first_paid(apps, schema_editor):
+    """
+    Set the clients first paid order dates from the paid orders
+    """
+    client_model = apps.get_model('clients', 'Client')
+    order_model = apps.get_model('finances', 'Order')
+    orders = order_model.objects.filter(
+        client_id=OuterRef('pk'), status='paid').annotate(
+            paid_at=Coalesce('paid_date', 'created')).order_by('paid_at')
+    client_model.objects.update(
+        first_paid_at=Subquery(orders.values('paid_at')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0093_auto_20190718_1048'),
+        ('finances', '0069_auto_20190814_0800'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='first_paid_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='The first paid order date', null=True, verbose_name='first paid at'),
+        ),
+        migrations.RunPython(backfill_first_paid, migrations.RunPython.noop),
+    ]
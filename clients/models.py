@@ -23,6 +23,7 @@ from billing.models import (CachedModel, ClientPermissionsModel, Comment,
 from finances.lib.calc import Calc
 from hotels.models import Country
 
+from .lib.services import add_rooms
 from .managers import (ClientManager, ClientServiceManager,
                        ClientWebsiteManager, CompanyManager)
 from .validators import validate_client_login_restrictions
@@ -421,6 +422,12 @@ lowercase letters, numbers, and "-" character.'),
         default=False, db_index=True, verbose_name=_('trial activated'))
     disabled_at = models.DateTimeField(
         db_index=True, null=True, blank=True, verbose_name=_('disabled at'))
+    first_paid_at = models.DateTimeField(
+        db_index=True,
+        null=True,
+        blank=True,
+        verbose_name=_('first paid at'),
+        help_text=_('The first paid order date'))
     url = models.URLField(
         db_index=True,
         null=True,
@@ -475,7 +482,7 @@ lowercase letters, numbers, and "-" character.'),
 
     @property
     def is_trial(self):
-        return not bool(self.orders.filter(status='paid').count())
+        return self.first_paid_at is None
 
     @property
     def first_name(self):
@@ -527,7 +534,7 @@ lowercase letters, numbers, and "-" character.'),
         """
         Update client restrictions
         """
-        if not rooms:
+        if rooms is None:
             rooms = Client.objects.count_rooms(client=self)
         self.restrictions.rooms_limit = rooms
         self.restrictions.save()
@@ -742,6 +749,8 @@ class ClientService(CommonInfo, TimeStampedModel, ClientPermissionsModel,
     )
 
     objects = ClientServiceManager()
+    tracker = FieldTracker(fields=('service', 'client', 'quantity',
+                                   'is_enabled', 'status', 'begin'))
 
     is_enabled = models.BooleanField(
         default=True, db_index=True, verbose_name=_('is enabled'))
@@ -821,8 +830,18 @@ class ClientService(CommonInfo, TimeStampedModel, ClientPermissionsModel,
 
         return begin if begin >= default_begin else default_begin
 
-    def save(self, *args, **kwargs):
-        self.price = Calc.factory(self).calc()
+    def save(self, *args, recalc=False, **kwargs):
+        """
+        Save the client service
+        The side effects are applied only if the related fields have changed.
+        An empty price or recalc recalculates the price and applies
+        all the side effects (e.g. after the prices changes).
+        """
+        changed = self.tracker.changed().keys()
+        if recalc or self.price is None:
+            changed = self.tracker.fields
+        if changed & {'service', 'client', 'quantity'}:
+            self.price = Calc.factory(self).calc()
 
         if self.begin is None:
             self.begin = self.get_default_begin()
@@ -835,18 +854,59 @@ class ClientService(CommonInfo, TimeStampedModel, ClientPermissionsModel,
             self.start_at = timezone.now()
         super(ClientService, self).save(*args, **kwargs)
 
-        if self.is_enabled:
+        if self.is_enabled and changed & {'is_enabled', 'service', 'client'}:
             ClientService.objects.disable(
                 client=self.client,
                 service_type=self.service.type,
                 exclude_pk=self.pk)
 
-        if self.status == 'active':
+        rooms = 0
+        if self.status == 'active' and changed & {
+                'status', 'service', 'client'
+        }:
+            if self.service.type == 'rooms':
+                rooms -= ClientService.objects.sum_rooms(
+                    client=self.client, exclude_pk=self.pk)
             ClientService.objects.deactivate(
                 client=self.client,
                 service_type=self.service.type,
                 exclude_pk=self.pk)
-        self.client.restrictions_update()
+
+        if changed & {'status', 'service', 'client', 'quantity', 'begin'}:
+            self._update_rooms(rooms)
+
+    @staticmethod
+    def _get_rooms(service_type, status, quantity, begin) -> int:
+        """
+        Get the rooms counted in the client rooms limit
+        """
+        if service_type == 'rooms' and status == 'active' and \
+           begin and begin <= timezone.now():
+            return quantity or 0
+        return 0
+
+    def _update_rooms(self, rooms=0) -> None:
+        """
+        Update the clients rooms limits by the service changes
+        """
+        tracker = self.tracker
+        prev_service = tracker.previous('service')
+        prev_type = self.service.type
+        if prev_service and prev_service != self.service_id:
+            prev_type = self.service.__class__.objects.values_list(
+                'type', flat=True).get(pk=prev_service)
+        prev_rooms = self._get_rooms(prev_type, tracker.previous('status'),
+                                     tracker.previous('quantity'),
+                                     tracker.previous('begin'))
+        rooms += self._get_rooms(self.service.type, self.status, self.quantity,
+                                 self.begin)
+
+        prev_client = tracker.previous('client')
+        if prev_client and prev_client != self.client_id:
+            add_rooms(Client.objects.get(pk=prev_client), -prev_rooms)
+        else:
+            rooms -= prev_rooms
+        add_rooms(self.client, rooms)
 
     @staticmethod
     def validate_dates(begin, end, is_new):
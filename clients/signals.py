@@ -2,16 +2,17 @@
 The clients signals module
 """
 from corsheaders.signals import check_request_enabled
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from finances.models import ClientDiscount, Discount
+from billing.lib import outbox
+from finances.models import ClientDiscount, Discount, Service
 from users.models import Profile
 
-from .lib import cors
-from .models import Client, ClientWebsite
-from .tasks import (invalidate_client_cache_task,
-                    invalidate_mb_client_login_cache)
+from .lib import cors, invalidation
+from .lib.services import remove_rooms
+from .models import Client, ClientService, ClientWebsite
+from .tasks import invalidate_mb_client_login_cache
 
 
 @receiver(pre_save, sender=Client, dispatch_uid='client_pre_save')
@@ -42,10 +43,11 @@ def client_post_save(sender, **kwargs):
         ClientDiscount.client_spanshot(discount, client)
 
     if tracker.has_changed('login') or tracker.has_changed('login_alias'):
-        invalidate_mb_client_login_cache.delay(client_id=client.id)
+        outbox.enqueue(
+            invalidate_mb_client_login_cache, kwargs={'client_id': client.id})
 
     if client.installation == 'installed':
-        invalidate_client_cache_task.delay(client_id=client.id)
+        invalidation.schedule(client.id)
     try:
         client.website
     except Client.website.RelatedObjectDoesNotExist:
@@ -56,6 +58,40 @@ def client_post_save(sender, **kwargs):
         website.save()
 
 
+@receiver(post_save, sender=ClientWebsite, dispatch_uid='website_post_save')
+def website_post_save(sender, **kwargs):
+    """
+    ClientWebsite post save signal
+    """
+    cors.own_domains.update(kwargs['instance'])
+
+
+@receiver(post_delete,
+          sender=ClientWebsite,
+          dispatch_uid='website_post_delete')
+def website_post_delete(sender, **kwargs):
+    """
+    ClientWebsite post delete signal
+    """
+    cors.own_domains.update(kwargs['instance'], deleted=True)
+
+
+@receiver(post_delete,
+          sender=ClientService,
+          dispatch_uid='client_service_post_delete')
+def client_service_post_delete(sender, **kwargs):
+    """
+    ClientService post delete signal
+    """
+    instance = kwargs['instance']
+    service_type = Service.objects.filter(
+        pk=instance.service_id).values_list('type', flat=True).first()
+    remove_rooms(
+        Client, instance.client_id,
+        ClientService._get_rooms(service_type, instance.status,
+                                 instance.quantity, instance.begin))
+
+
 def cors_allow_with_own_domains(sender, request, **kwargs):
     """
     Check if the CORS request is allowed
@@ -1,20 +1,23 @@
 import logging
-from itertools import groupby
 
 from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 
 from billing.celery import app
-from billing.lib import mb
+from billing.lib import mb, outbox
+from billing.lib.chunks import chunked_task
 from billing.lib.lang import select_locale
-from billing.lib.messengers.mailer import mail_client, mail_managers
-from finances.models import Order
+from billing.lib.locks import locked_task
+from billing.lib.messengers.mailer import (mail_batch, mail_client,
+                                           mail_managers)
 
+from .lib import invalidation
+from .lib.orders import OrdersGenerator
 from .models import Client, ClientService
 
 
-@app.task
-def invalidate_client_cache_task(client_id):
+@app.task(bind=True)
+def invalidate_client_cache_task(self, client_id):
     """
     Client invalidation task
     """
@@ -22,13 +25,48 @@ def invalidate_client_cache_task(client_id):
         client = Client.objects.get(pk=client_id)
     except Client.DoesNotExist:
         return False
-    mb.client_cache_invalidate(client)
+    mb.client_cache_invalidate(client, task=self)
 
     return True
 
 
+def _invalidate_clients_cache(clients) -> int:
+    """
+    Invalidate the clients caches and queue the failed ones again
+    """
+    clients = list(clients)
+    failed = [c.pk for c in mb.clients_cache_invalidate(clients)]
+    invalidation.complete([c.pk for c in clients if c.pk not in failed])
+    invalidation.retry(failed)
+
+    return len(clients) - len(failed)
+
+
+@app.task
+def invalidate_clients_cache_task(client_ids):
+    """
+    Clients invalidation task
+    """
+    return _invalidate_clients_cache(
+        Client.objects.filter(pk__in=client_ids).select_related('country'))
+
+
 @app.task
-def install_client_task(client_id):
+def flush_clients_cache_invalidation():
+    """
+    Invalidate the queued clients caches
+    """
+    client_ids = invalidation.flush()
+    if not client_ids:
+        return 0
+    clients = Client.objects.filter(
+        pk__in=client_ids, installation='installed').select_related('country')
+    return _invalidate_clients_cache(clients)
+
+
+@app.task(bind=True)
+@outbox.once
+def install_client_task(self, client_id):
     """
     Client installation task
     """
@@ -40,7 +78,7 @@ def install_client_task(client_id):
     if client.installation == 'installed':
         return False
 
-    if mb.client_install(client):
+    if mb.client_install(client, task=self):
         client.installation = 'process'
         client.save()
         return True
@@ -48,7 +86,8 @@ def install_client_task(client_id):
     return False
 
 
-@app.task
+@app.task(queue=settings.CELERY_MAIL_QUEUE)
+@outbox.once
 def mail_managers_task(subject, data, template=None):
     if template:
         mail_managers(subject, data, template)
@@ -56,7 +95,8 @@ def mail_managers_task(subject, data, template=None):
         mail_managers(subject, data)
 
 
-@app.task
+@app.task(queue=settings.CELERY_MAIL_QUEUE)
+@outbox.once
 def mail_client_task(
         subject,
         template,
@@ -90,43 +130,46 @@ def mail_client_task(
             return False
 
 
-@app.task
-def client_greeting_email(days=settings.MB_CLIENT_GREETING_EMAIL_DAYS):
+@chunked_task(
+    Client.objects.get_for_greeting,
+    context=mail_batch,
+    queue=settings.CELERY_MAIL_QUEUE)
+def client_greeting_email(client, days=settings.MB_CLIENT_GREETING_EMAIL_DAYS):
     """
     The task for sending welcome emails to trial clients
     """
-    clients = Client.objects.get_for_greeting(days)
-    for client in clients:
-        with select_locale(client):
-            mail_client(subject=_('How is your Sales?'),
-                        template='emails/client_welcome.html',
-                        data={
-                            'client': client,
-                        },
-                        client=client)
+    with select_locale(client):
+        mail_client(subject=_('How is your Sales?'),
+                    template='emails/client_welcome.html',
+                    data={
+                        'client': client,
+                    },
+                    client=client)
 
 
-@app.task
-def client_disabled_email(days=settings.MB_CLIENT_DISABLED_FIRST_EMAIL_DAYS):
+@chunked_task(
+    Client.objects.get_disabled,
+    context=mail_batch,
+    queue=settings.CELERY_MAIL_QUEUE)
+def client_disabled_email(client,
+                          days=settings.MB_CLIENT_DISABLED_FIRST_EMAIL_DAYS):
     """
     The task for sending emails to disabled clients
     """
-    clients = Client.objects.get_disabled(days)
-    for client in clients:
-        with select_locale(client):
-            mail_client(subject=_('we miss You!'),
-                        template='emails/client_disabled.html',
-                        data={
-                            'order':
-                            client.orders.get_expired(('archived', )).first(),
-                            'client':
-                            client,
-                        },
-                        client=client)
+    with select_locale(client):
+        mail_client(subject=_('we miss You!'),
+                    template='emails/client_disabled.html',
+                    data={
+                        'order':
+                        client.orders.get_expired(('archived', )).first(),
+                        'client':
+                        client,
+                    },
+                    client=client)
 
 
-@app.task
-def invalidate_mb_client_login_cache(client_id):
+@app.task(bind=True)
+def invalidate_mb_client_login_cache(self, client_id):
     """
     Invalidate client login cache on the remote Maxibooking server
     """
@@ -134,62 +177,50 @@ def invalidate_mb_client_login_cache(client_id):
         client = Client.objects.get(pk=client_id)
     except Client.DoesNotExist:
         return False
-    mb.client_login_cache_invalidate(client)
+    mb.client_login_cache_invalidate(client, task=self)
 
     return True
 
 
-@app.task
-def client_services_activation():
+@chunked_task(ClientService.objects.find_for_activation)
+def client_services_activation(client_service):
     """
     Client services periodical activation
     """
-    client_services = ClientService.objects.find_for_activation()
-    for client_service in client_services:
-        logging.getLogger('billing').info(
-            'Activation client service {}'.format(client_service))
-        client_service.status = 'active'
-        client_service.save()
-        client_service.client.restrictions_update()
+    logging.getLogger('billing').info(
+        'Activation client service {}'.format(client_service))
+    client_service.status = 'active'
+    client_service.save()
 
 
 @app.task
+@locked_task()
 def client_services_update():
     """
     Client services periodical update
     """
-    client_services = [
-        s for s in ClientService.objects.find_ended()
-        if not s.orders.filter(status__in=('new', 'processing')).count()
-    ]
-    grouped_services = [
-        list(r) for k, r in groupby(client_services, lambda i: i.client.id)
-    ]
-    for group in grouped_services:
-        order = Order()
-        order.client = group[0].client
-        order.save()
-        for client_service in group:
-            logging.getLogger('billing').info(
-                'Generating order for client service {}'.format(
-                    client_service))
-            if client_service.status != 'next':
-                client_service.end = client_service.service.get_default_end(
-                    client_service.end)
-            # client_service.status = 'processing'
-            client_service.is_paid = False
-            client_service.price = None
-            client_service.save()
-            order.client_services.add(client_service)
-        order.price = None
-        order.save()
+    OrdersGenerator(ClientService.objects.find_for_orders()).generate()
 
 
-@app.task
-def client_archivation():
+@chunked_task(Client.objects.get_for_archivation)
+def client_archivation(client):
     """
     Client archivation
     """
-    clients = Client.objects.get_for_archivation()
+    mb.client_archive(client)
+
+
+@app.task
+@locked_task()
+def restrictions_reconciliation():
+    """
+    Fix the clients rooms limits differing from the rooms count
+    """
+    clients = list(Client.objects.get_rooms_drift())
     for client in clients:
-        mb.client_archive(client)
+        logging.getLogger('billing').warning(
+            'Client {} rooms limit drift: {} instead of {}.'.format(
+                client, client.restrictions.rooms_limit, client.rooms))
+        client.restrictions_update(rooms=client.rooms)
+
+    return len(clients)
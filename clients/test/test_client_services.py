@@ -1,17 +1,29 @@
 import json
+from io import StringIO
+from itertools import groupby
 
 import arrow
 import pytest
+from django.contrib import admin
+from django.core.management import call_command
+from django.db import transaction
 from django.urls import reverse
 from moneyed import EUR, Money
 
+from billing.lib import outbox
 from billing.lib.test import json_contains
+from clients.admin import ClientServiceAdmin
+from clients.lib import services
+from clients.lib.orders import OrdersGenerator
+from clients.lib.services import services_batch
 from clients.managers import ServiceCategoryGroup
 from clients.models import Client, ClientService
-from clients.tasks import client_services_activation, client_services_update
+from clients.tasks import (client_services_activation, client_services_update,
+                           restrictions_reconciliation)
 from finances.lib.calc import Calc
 from finances.models import (ClientDiscount, Order, Price, Service,
                              ServiceCategory)
+from finances.tasks import order_notify_task
 
 pytestmark = pytest.mark.django_db
 
@@ -252,6 +264,19 @@ def test_client_services_update_with_discount(admin_client, discounts):
     assert order.client_services.count() == 2
 
 
+def test_client_services_update_notify(mocker):
+    enqueue = mocker.spy(outbox, 'enqueue')
+    generator = OrdersGenerator(ClientService.objects.find_for_orders())
+    orders = generator.generate()
+
+    assert orders
+    notified = [
+        call[0][1][0] for call in enqueue.call_args_list
+        if call[0][0] is order_notify_task
+    ]
+    assert notified == [o.pk for o in orders]
+
+
 def test_client_services_update_next_task(admin_client):
     end = arrow.utcnow().shift(months=2)
     service = Service.objects.get(pk=1)
@@ -289,6 +314,82 @@ def test_client_services_update_next_task(admin_client):
     assert orders.count() == 1
 
 
+def legacy_client_services_update():
+    """
+    The client services update by saving the services one by one
+    """
+    client_services = [
+        s for s in ClientService.objects.find_ended()
+        if not s.orders.filter(status__in=('new', 'processing')).count()
+    ]
+    for _, group in groupby(client_services, lambda i: i.client.id):
+        group = list(group)
+        order = Order()
+        order.client = group[0].client
+        order.save()
+        for client_service in group:
+            if client_service.status != 'next':
+                client_service.end = client_service.service.get_default_end(
+                    client_service.end)
+            client_service.is_paid = False
+            client_service.price = None
+            client_service.save()
+            order.client_services.add(client_service)
+        order.price = None
+        order.save()
+
+
+def client_services_update_snapshot():
+    services = list(
+        ClientService.objects.order_by('pk').values_list(
+            'pk', 'end', 'price', 'price_currency', 'is_paid', 'is_enabled',
+            'status'))
+    orders = sorted(
+        Order.objects.values_list('client_id', 'status', 'price',
+                                  'price_currency', 'note_en', 'note_ru',
+                                  'discount_id'),
+        key=str)
+    links = sorted(
+        Order.client_services.through.objects.values_list(
+            'clientservice_id', 'order__client_id', 'order__status'))
+    return services, orders, links
+
+
+def test_client_services_update_as_legacy(admin_client):
+    begin = arrow.utcnow().shift(months=-1).datetime
+    end = arrow.utcnow().shift(days=+5).datetime
+    service_rooms = Service.objects.get(pk=1)
+    entries = []
+    for quantity, status, is_paid in ((2, 'active', True), (3, 'next',
+                                                            False)):
+        client_service = ClientService()
+        client_service.quantity = quantity
+        client_service.begin = begin
+        client_service.end = end
+        client_service.service = service_rooms
+        client_service.client_id = 4
+        client_service.status = status
+        client_service.is_paid = is_paid
+        client_service.save()
+        entries.append(client_service.pk)
+    ClientService.objects.filter(pk__in=entries).update(
+        is_enabled=True, status='active')
+    ClientService.objects.filter(pk=entries[1]).update(status='next')
+
+    price = service_rooms.prices.get(pk=8)
+    price.price = Money(2500, EUR)
+    price.save()
+
+    with transaction.atomic():
+        legacy_client_services_update()
+        expected = client_services_update_snapshot()
+        transaction.set_rollback(True)
+
+    client_services_update.delay()
+    assert client_services_update_snapshot() == expected
+    assert Order.objects.filter(client_id=4, status='new').count() == 1
+
+
 def test_client_services_default_dates(admin_client):
     prev_client_service = ClientService.objects.get(pk=1)
     prev_client_service.end = arrow.utcnow().shift(days=4).datetime
@@ -340,3 +441,129 @@ def test_client_services_activation_task(admin_client, make_orders):
     assert client_service.is_paid is True
     assert client_service.status == 'active'
     assert client.restrictions.rooms_limit == 5
+
+
+def test_client_service_lean_save(django_assert_num_queries):
+    client_service = ClientService.objects.get(pk=1)
+    client_service.is_paid = not client_service.is_paid
+    with django_assert_num_queries(1):
+        client_service.save()
+
+    client_service.quantity += 1
+    client_service.save()
+    client_service.client.refresh_from_db()
+    assert client_service.price == Calc.factory(client_service).calc()
+    assert client_service.client.restrictions.rooms_limit == \
+        Client.objects.count_rooms(client_service.client)
+
+
+def test_client_services_batch(mocker):
+    client = Client.objects.get(pk=2)
+    client.restrictions_update()
+    update_rooms = mocker.spy(services, 'update_rooms')
+
+    with services_batch():
+        for client_service in ClientService.objects.filter(client_id=2):
+            client_service.quantity += 1
+            client_service.save()
+        assert update_rooms.call_count == 0
+
+    assert update_rooms.call_count == 1
+    client = Client.objects.get(pk=2)
+    assert client.restrictions.rooms_limit == Client.objects.count_rooms(
+        client)
+
+
+def test_client_service_rooms_limit():
+    def assert_rooms(*clients):
+        for client in clients:
+            client = Client.objects.get(pk=client.pk)
+            assert client.restrictions.rooms_limit == \
+                Client.objects.count_rooms(client)
+
+    client, other = Client.objects.get(pk=1), Client.objects.get(pk=2)
+    client.restrictions_update()
+    other.restrictions_update()
+
+    client_service = ClientService()
+    client_service.quantity = 3
+    client_service.begin = arrow.utcnow().shift(days=-1).datetime
+    client_service.service = Service.objects.get(pk=1)
+    client_service.client = client
+    client_service.save()
+    assert_rooms(client)
+
+    client_service.quantity = 5
+    client_service.save()
+    assert_rooms(client)
+
+    client_service.client = other
+    client_service.save()
+    assert_rooms(client, other)
+
+    client_service.status = 'next'
+    client_service.save()
+    assert_rooms(other)
+
+    client_service.status = 'active'
+    client_service.save()
+    assert_rooms(other)
+
+
+def test_client_service_delete_rooms_limit():
+    client = Client.objects.get(pk=1)
+    client_service = ClientService()
+    client_service.quantity = 3
+    client_service.begin = arrow.utcnow().shift(days=-1).datetime
+    client_service.service = Service.objects.get(pk=1)
+    client_service.client = client
+    client_service.save()
+    client.restrictions_update()
+    rooms = Client.objects.get(pk=1).restrictions.rooms_limit
+
+    client_service.delete()
+    client = Client.objects.get(pk=1)
+    assert client.restrictions.rooms_limit == rooms - 3
+    assert client.restrictions.rooms_limit == Client.objects.count_rooms(
+        client)
+
+
+def test_restrictions_reconciliation():
+    client = Client.objects.get(pk=2)
+    client.restrictions_update()
+    rooms = client.restrictions.rooms_limit
+    assert not Client.objects.get_rooms_drift().filter(pk=2).exists()
+
+    client.restrictions.rooms_limit = rooms + 10
+    client.restrictions.save()
+    drift = Client.objects.get_rooms_drift().get(pk=2)
+    assert drift.rooms == rooms
+
+    out = StringIO()
+    call_command('restrictions_drift', stdout=out)
+    assert 'rooms limit {}, rooms {}'.format(rooms + 10,
+                                             rooms) in out.getvalue()
+
+    restrictions_reconciliation.delay()
+    client = Client.objects.get(pk=2)
+    assert client.restrictions.rooms_limit == rooms
+    assert not Client.objects.get_rooms_drift().filter(pk=2).exists()
+
+
+def test_client_service_recalc():
+    """
+    The admin save should recalculate the price of the unchanged service
+    """
+    client_service = ClientService.objects.get(pk=1)
+    price = Calc.factory(client_service).calc()
+    client_service.price = Money(1, price.currency)
+    client_service.save()
+    client_service.refresh_from_db()
+
+    assert client_service.price == Money(1, price.currency)
+
+    ClientServiceAdmin(ClientService, admin.site).save_model(
+        None, client_service, None, True)
+    client_service.refresh_from_db()
+
+    assert client_service.price == price
@@ -1,8 +1,10 @@
 import json
+from io import StringIO
 
 import arrow
 import pytest
 from django.conf import settings
+from django.core.management import call_command
 from django.core.validators import ValidationError
 from django.urls import reverse
 from moneyed import EUR, Money
@@ -730,6 +732,7 @@ def test_client_by_logins(make_orders):
     assert Client.objects.get_by_orders(False).count() == 6
 
     Order.objects.update(status='new')
+    Client.objects.update_first_paid()
 
     assert Client.objects.get_by_orders(True).count() == 0
     assert Client.objects.get_by_orders(False).count() == 7
@@ -857,3 +860,42 @@ def test_clients_welcome_email(mailoutbox, make_orders):
     mail = mailoutbox[-1]
 
     assert 'user rus, как Ваши продажи?' in mail.subject
+
+
+def test_client_first_paid(make_orders):
+    """
+    The client first paid order date should follow the paid orders
+    """
+    paid = Order.objects.get(pk=2)
+    order = Order.objects.get(pk=1)
+    assert Client.objects.get(pk=1).first_paid_at == paid.created
+
+    order.set_paid('bill')
+    assert Client.objects.get(pk=1).first_paid_at == paid.created
+
+    paid.status = 'canceled'
+    paid.save()
+    assert Client.objects.get(pk=1).first_paid_at == order.paid_date
+
+    order.client_id = 2
+    order.save()
+    assert Client.objects.get(pk=1).is_trial is True
+    assert Client.objects.get(pk=2).first_paid_at == order.paid_date
+
+    order.delete()
+    assert Client.objects.get(pk=2).is_trial is True
+
+
+def test_client_first_paid_backfill(make_orders):
+    """
+    The command should backfill the clients first paid order dates
+    """
+    Client.objects.update(first_paid_at=None)
+    assert Client.objects.get_by_orders(True).count() == 0
+
+    out = StringIO()
+    call_command('clients_first_paid', chunk=2, stdout=out)
+
+    assert 'paid: 1' in out.getvalue()
+    assert Client.objects.get(pk=1).first_paid_at == Order.objects.get(
+        pk=2).created
@@ -2,9 +2,11 @@
 The test CORS module
 """
 import pytest
+from django.db import connection
 from django.http import HttpRequest
 from django.test import TestCase
 
+from clients.lib.cors import check_host, normalize_host, own_domains
 from clients.models import Client, ClientWebsite
 from clients.signals import cors_allow_with_own_domains
 
@@ -57,6 +59,29 @@ def test_cors_allow_domains_from_settings(mocker):
     assert cors_allow_with_own_domains(None, HttpRequest())
 
 
+def test_normalize_host():
+    assert normalize_host('http://www.Hotel.one:8080/path') == 'hotel.one'
+    assert normalize_host('hotel.one/path?query=1') == 'hotel.one'
+    assert normalize_host('www.hotel.one:8080') == 'hotel.one'
+
+
+def test_check_host_rollback(mocker):
+    """
+    The uncommitted website should not be allowed after the rollback
+    """
+    own_domains.reset()
+    website = Client.objects.get(pk=1).website
+    website.url = 'http://hotel.one'
+    website.own_domain_name = True
+    own_domains.update(website)
+
+    assert check_host('hotel.one')
+
+    mocker.patch.object(connection, 'in_atomic_block', False)
+    assert not check_host('hotel.one')
+    assert not own_domains.dirty
+
+
 @pytest.mark.usefixtures('mocker')
 class CorsTestCase(TestCase):
     """
@@ -85,3 +110,27 @@ class CorsTestCase(TestCase):
         website.save()
         with self.assertNumQueries(1):
             ClientWebsite.objects.check_by_own_domain('hotel.one')
+
+    def test_check_host_index(self):
+        """
+        Check if the own domains index is used without the database queries
+        """
+        website = Client.objects.get(pk=1).website
+        website.url = 'http://www.hotel.one'
+        website.own_domain_name = True
+        website.save()
+
+        with self.assertNumQueries(0):
+            assert check_host('hotel.one')
+            assert check_host('www.hotel.one:8080')
+            assert check_host('maxi-booking.com')
+            assert not check_host('sub.hotel.one')
+            assert not check_host('otel.one')
+
+        own_domains.reset()
+        with self.assertNumQueries(1):
+            assert check_host('hotel.one')
+
+        website.delete()
+        with self.assertNumQueries(0):
+            assert not check_host('hotel.one')
@@ -0,0 +1,79 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+
+from billing.lib.test import stub_server
+
+from ..lib import invalidation
+from ..models import Client
+from ..tasks import flush_clients_cache_invalidation
+
+pytestmark = pytest.mark.django_db
+
+
+def test_invalidation_schedule(mocker):
+    enqueue = mocker.patch('clients.lib.invalidation.outbox.enqueue')
+    assert invalidation.schedule(1)
+    assert not invalidation.schedule(1)
+    assert invalidation.schedule(2)
+    assert not invalidation.schedule(2)
+    enqueue.assert_called_once_with(
+        'clients.tasks.flush_clients_cache_invalidation',
+        countdown=settings.MB_INVALIDATION_DELAY)
+
+    assert invalidation.flush() == [1, 2]
+    assert invalidation.flush() == []
+    assert invalidation.schedule(1)
+    assert enqueue.call_count == 2
+    assert invalidation.flush() == [1]
+
+
+def test_invalidation_schedule_claimed(mocker):
+    enqueue = mocker.patch('clients.lib.invalidation.outbox.enqueue')
+    cache.set(invalidation.DONE_KEY, 1, None)
+    assert invalidation.schedule(3)
+    enqueue.assert_called_once_with(
+        'clients.tasks.invalidate_client_cache_task',
+        kwargs={'client_id': 3})
+    assert invalidation.schedule(3)
+
+
+def test_client_save_invalidation():
+    with stub_server() as (url, received):
+        Client.objects.filter(pk=1).update(url=url, installation='installed')
+        client = Client.objects.get(pk=1)
+        client.save()
+
+    assert [d for _, d in received] == [{'token': 'token_ru'}]
+
+
+def test_invalidation_failed(mocker):
+    enqueue = mocker.patch('clients.lib.invalidation.outbox.enqueue')
+    with stub_server(status=500) as (url, received):
+        Client.objects.filter(pk=1).update(url=url, installation='installed')
+        assert invalidation.schedule(1)
+        assert flush_clients_cache_invalidation() == 0
+
+    assert received
+    assert cache.get(invalidation.CLIENT_KEY.format(1))
+    assert cache.get(invalidation.ATTEMPTS_KEY.format(1)) == 1
+    assert enqueue.call_count == 2
+    enqueue.assert_called_with(
+        'clients.tasks.flush_clients_cache_invalidation',
+        countdown=settings.MB_INVALIDATION_DELAY)
+
+    with stub_server() as (url, received):
+        Client.objects.filter(pk=1).update(url=url)
+        assert flush_clients_cache_invalidation() == 1
+
+    assert not cache.get(invalidation.CLIENT_KEY.format(1))
+    assert not cache.get(invalidation.ATTEMPTS_KEY.format(1))
+
+
+def test_invalidation_retry_exceeded(mocker, settings):
+    mocker.patch('clients.lib.invalidation.outbox.enqueue')
+    settings.MB_MAX_RETRIES = 1
+    assert invalidation.retry([1]) == [1]
+    invalidation.flush()
+    assert invalidation.retry([1]) == []
+    assert not cache.get(invalidation.CLIENT_KEY.format(1))
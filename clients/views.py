@@ -7,7 +7,7 @@ from rest_framework.decorators import detail_route
 from rest_framework.response import Response
 
 from billing.exceptions import BaseException
-from billing.lib import mb
+from billing.lib import mb, outbox
 from billing.lib.lang import select_locale
 
 from .models import (Client, ClientAuth, ClientRu, ClientService,
@@ -275,8 +275,10 @@ class ClientViewSet(viewsets.ModelViewSet):
             'Get client installation request. Id: {}; login: {}'.format(
                 client.id, client.login))
 
-        install_client_task.apply_async(
-            kwargs={'client_id': client.id}, queue='priority_high')
+        outbox.enqueue(
+            install_client_task,
+            kwargs={'client_id': client.id},
+            queue='priority_high')
         return Response({
             'status': True,
             'message': 'client installation begin'
@@ -303,6 +305,11 @@ class ClientViewSet(viewsets.ModelViewSet):
             'Get client fixtures request. Id: {}; login: {}'.format(
                 client.id, client.login))
         response = mb.client_fixtures(client)
+        if response is None:
+            return Response({
+                'status': False,
+                'message': 'maxibooking is unavailable, try again later',
+            })
         if response and response.get('status', True):
             return Response({
                 'status': True,
@@ -347,23 +354,29 @@ class ClientViewSet(viewsets.ModelViewSet):
                     except ClientWebsite.DoesNotExist:
                         website = None
 
-                    mail_client_task.delay(
-                        subject=_('Welcome to MaxiBooking!'),
-                        template='emails/registration.html',
-                        data={
-                            'login': client.login,
-                            'name': client.name,
-                            'url': request_json['url'] + '/user/login',
-                            'website': website,
-                            'password': request_json['password']
-                        },
-                        client_id=client.id)
+                    outbox.enqueue(
+                        mail_client_task,
+                        kwargs={
+                            'subject': _('Welcome to MaxiBooking!'),
+                            'template': 'emails/registration.html',
+                            'data': {
+                                'login': client.login,
+                                'name': client.name,
+                                'url': request_json['url'] + '/user/login',
+                                'website': website,
+                                'password': request_json['password']
+                            },
+                            'client_id': client.id
+                        })
                 return Response({'status': True})
             else:
-                mail_client_task.delay(
-                    subject=_('Registration failed'),
-                    template='emails/registration_fail.html',
-                    data={},
-                    client_id=client.id)
+                outbox.enqueue(
+                    mail_client_task,
+                    kwargs={
+                        'subject': _('Registration failed'),
+                        'template': 'emails/registration_fail.html',
+                        'data': {},
+                        'client_id': client.id
+                    })
 
         return Response({'status': False})
@@ -2,11 +2,14 @@ import arrow
 import pytest
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.management import call_command
 from django.core.validators import ValidationError
 from moneyed import EUR, RUB, Money
 
+from clients.lib.cors import own_domains
 from clients.models import Client
+from finances.lib.calc import price_tables
 from finances.models import Discount, Order, Price, Service
 from hotels.models import Country
 from users.models import Department
@@ -25,6 +28,16 @@ def django_db_setup(django_db_setup, django_db_blocker):
                      'tests/exchange_rates')
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    The database is rolled back after each test, so the caches are too
+    """
+    cache.clear()
+    price_tables.tables.clear()
+    own_domains.reset()
+
+
 @pytest.fixture()
 def discounts():
     discount = Discount()
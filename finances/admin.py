@@ -15,6 +15,8 @@ from reversion.admin import VersionAdmin
 
 from billing.admin import (AdminRowActionsMixin, ChangePermissionMixin,
                            JsonAdmin, ManagerListMixin, TextFieldListFilter)
+from billing.lib.signals import suppress_signals
+from finances.lib import notes
 from finances.systems.lib import BraintreeGateway
 
 from .models import (Discount, Order, Price, Service, ServiceCategory,
@@ -315,6 +317,27 @@ class OrderAdmin(AdminRowActionsMixin, VersionAdmin, AjaxSelectAdmin,
         response['Content-Disposition'] = content
         return response
 
+    def get_object(self, request, object_id, from_field=None):
+        """
+        Get the order with the rendered notes
+        """
+        obj = super(OrderAdmin, self).get_object(request, object_id,
+                                                 from_field)
+        return notes.ensure(obj) if obj else obj
+
+    def save_related(self, request, form, formsets, change):
+        """
+        Save the order client services and finalize the order once
+        if they have changed
+        """
+        if change and 'client_services' not in form.changed_data:
+            return super(OrderAdmin, self).save_related(
+                request, form, formsets, change)
+        with suppress_signals('order'):
+            super(OrderAdmin, self).save_related(request, form, formsets,
+                                                 change)
+        form.instance.finalize()
+
     def get_row_actions(self, obj):
         row_actions = [
             {
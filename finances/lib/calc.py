@@ -1,12 +1,17 @@
 import logging
+import uuid
 from typing import Optional
 
 import moneyed
+import numpy
 from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
 
 from billing.lib.utils import clsfstr
 
-from .rates import convert_money
+from .rates import convert_amounts, convert_money
 
 CURRENCIES_CODES = moneyed.CURRENCIES.keys()
 
@@ -42,6 +47,198 @@ class CalcException(Exception):
     pass
 
 
+class PriceTable(object):
+    """
+    The compiled table of the service price tiers
+
+    The units between the tiers boundaries are split into segments.
+    Every unit of a segment is matched by the same price, so the total
+    price is calculated per segment instead of per unit.
+    """
+
+    def __init__(self, prices) -> None:
+        prices = list(prices)
+        self.tiers = [(p.period_from, p.period_to, p.price, p.for_unit)
+                      for p in prices]
+        default = [p.price for p in prices if p.for_unit]
+        self.default = default[0] if default else None
+        self.segments = self._compile_segments()
+
+    def _match(self, unit: int) -> Optional[int]:
+        """
+        Get the index of the first tier matching the unit
+        """
+        for index, (period_from, period_to, _, _) in enumerate(self.tiers):
+            if (period_from is None or period_from <= unit) and (
+                    period_to is None or period_to >= unit):
+                return index
+        return None
+
+    def _compile_segments(self) -> list:
+        """
+        Split the units into the segments: (begin, end, tier index)
+        The end is exclusive, None means infinity.
+        """
+        bounds = {1}
+        for period_from, period_to, _, _ in self.tiers:
+            if period_from is not None and period_from > 1:
+                bounds.add(period_from)
+            if period_to is not None and period_to >= 1:
+                bounds.add(period_to + 1)
+        bounds = sorted(bounds)
+        ends = bounds[1:] + [None]
+
+        return [(begin, end, self._match(begin))
+                for begin, end in zip(bounds, ends)]
+
+    def total(self, quantity: int):
+        """
+        Calculate the total price for the quantity
+        """
+        total = 0
+        counted = set()
+        for begin, end, index in self.segments:
+            if begin > quantity:
+                break
+            units = min(end, quantity + 1) if end else quantity + 1
+            units -= begin
+            if index is None:
+                if self.default is not None:
+                    total += self.default * units
+                continue
+            _, _, price, for_unit = self.tiers[index]
+            if for_unit:
+                total += price * units
+            elif index not in counted:
+                counted.add(index)
+                total += price
+        return total
+
+    def totals(self, quantity: int) -> tuple:
+        """
+        Calculate the total prices for the quantities from 1 to quantity
+        Return the cumulative amounts array and the currency.
+        """
+        costs = numpy.zeros(quantity, dtype=object)
+        currencies = set()
+        counted = set()
+        for begin, end, index in self.segments:
+            if begin > quantity:
+                break
+            end = min(end, quantity + 1) if end else quantity + 1
+            if index is None:
+                price, for_unit = self.default, True
+            else:
+                _, _, price, for_unit = self.tiers[index]
+            if price is None:
+                continue
+            currencies.add(price.currency)
+            if for_unit:
+                costs[begin - 1:end - 1] = price.amount
+            elif index not in counted:
+                counted.add(index)
+                costs[begin - 1] = price.amount
+
+        if len(currencies) > 1:
+            raise CalcException('Prices with different currencies.')
+
+        return numpy.cumsum(costs), currencies.pop() if currencies else None
+
+    def __str__(self):
+        return '[{}]'.format(', '.join([
+            '{} {}-{} {}'.format(
+                price,
+                period_from or '∞',
+                period_to or '∞',
+                'per unit' if for_unit else 'per period',
+            ) for period_from, period_to, price, for_unit in self.tiers
+        ]))
+
+
+class PriceTableCache(object):
+    """
+    The in-process cache of the compiled price tables
+
+    The tables are stored by the service and the country. Every service
+    has a version in the shared cache, so the tables are recompiled in all
+    processes as soon as the service or its prices have been changed.
+    """
+    version_key = 'finances_price_table_version_{}'
+
+    def __init__(self) -> None:
+        self.tables = {}  # type: dict
+
+    def _get_version(self, service_id: int) -> str:
+        """
+        Get the current version of the service price tables
+        """
+        key = self.version_key.format(service_id)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex, None)
+            version = cache.get(key)
+        return version
+
+    def get(self, service, country) -> PriceTable:
+        """
+        Get the compiled price table of the service for the country
+        """
+        return self.get_many([(service.pk, country.pk)])[(service.pk,
+                                                          country.pk)]
+
+    def get_many(self, keys) -> dict:
+        """
+        Get the compiled price tables by the (service id, country id) keys
+        The missing tables are compiled from a single prices query.
+        """
+        tables = {}
+        missing = {}
+        for key in set(keys):
+            version = self._get_version(key[0])
+            entry = self.tables.get(key)
+            if entry and version is not None and entry[0] == version:
+                tables[key] = entry[1]
+            else:
+                missing[key] = version
+        if not missing:
+            return tables
+
+        rows = {}  # type: dict
+        prices = apps.get_model('finances.Price').objects.filter_by_countries(
+            [k[1] for k in missing], [k[0] for k in missing])
+        for price in prices:
+            rows.setdefault((price.service_id, price.country_id),
+                            []).append(price)
+
+        for key, version in missing.items():
+            service_id, country_id = key
+            table = PriceTable(
+                rows.get(key, rows.get((service_id, None), [])))
+            self.tables[key] = (version, table)
+            tables[key] = table
+
+        return tables
+
+    def invalidate(self, service_id: int) -> None:
+        """
+        Invalidate the service price tables
+        """
+
+        def _invalidate():
+            cache.set(self.version_key.format(service_id),
+                      uuid.uuid4().hex, None)
+            for key in [k for k in self.tables if k[0] == service_id]:
+                self.tables.pop(key, None)
+
+        # the second invalidation prevents caching of the stale rows
+        # read by other processes before the transaction is committed
+        _invalidate()
+        transaction.on_commit(_invalidate)
+
+
+price_tables = PriceTableCache()
+
+
 class CalcByQantityPeriodCountry(object):
     """
     Calculate the service price by the period, country and quantity
@@ -128,6 +325,58 @@ class CalcByQuery(CalcByQantityPeriodCountry):
         )
 
 
+class CalcMatrixByQuery(CalcByQantityPeriodCountry):
+    """
+    Calculate the prices of the all services periods
+    for the range of quantities by the query serializer
+    """
+
+    def __init__(self, query: dict) -> None:
+        super().__init__(
+            None,
+            query.get('period_units'),
+            query.get('quantity_to'),
+            query.get('country'),
+        )
+        self.quantity_from = query.get('quantity_from')
+
+    def _calc_services(self) -> list:
+        if not self.country:
+            raise CalcException('Invalid country or quantity.')
+
+        tables = price_tables.get_many(
+            [(s.pk, self.country.pk) for s in self.services])
+        local_currency = getattr(self.country, 'currency')
+        prices = []
+        for service in self.services:
+            table = tables[(service.pk, self.country.pk)]
+            if not table.tiers:
+                raise CalcException('Empty prices.')
+            amounts, currency = table.totals(self.quantity)
+            amounts = amounts[self.quantity_from - 1:]
+            currency_code = getattr(currency, 'code', None)
+
+            amounts_local = None
+            if local_currency and currency_code:
+                amounts_local = convert_amounts(amounts, currency_code,
+                                                local_currency)
+
+            prices.append({
+                'period':
+                service.period,
+                'price_currency':
+                currency_code,
+                'prices':
+                amounts.tolist(),
+                'price_currency_local':
+                local_currency if amounts_local is not None else None,
+                'prices_local':
+                amounts_local,
+            })
+
+        return prices
+
+
 class Calc(object):
     """
     Calc abstract class
@@ -175,14 +424,12 @@ class Calc(object):
         if not quantity or not country:
             raise CalcException('Invalid country or quantity.')
 
-        prices = list(
-            apps.get_model('finances.Price').objects.filter_by_country(
-                country, self.service))
-        if not prices:
+        table = price_tables.get(self.service, country)
+        if not table.tiers:
             raise CalcException('Empty prices.')
 
-        total = self._do_calc_total_price(prices, quantity)
-        self._log_calc_result(total, prices, country, quantity)
+        total = table.total(quantity)
+        self._log_calc_result(total, table, country, quantity)
 
         return total
 
@@ -196,30 +443,6 @@ class Calc(object):
 
         return country
 
-    def _do_calc_total_price(self, prices, quantity):
-        """
-        Calculate price based on prices table and quantity
-        """
-        table = []
-        default = [d for d in prices if d.for_unit]
-
-        for r in range(1, quantity + 1):
-            p = [
-                p for p in prices
-                if (p.period_from is None or p.period_from <= r) and (
-                    p.period_to is None or p.period_to >= r)
-            ]
-            if p and not p[0].for_unit and p[0] in table:
-                p[0] = 0
-            if not p:
-                p.append(default[0] if default else 0)
-            table.append(p[0])
-
-        total = 0
-        for item in table:
-            total += getattr(item, 'price', 0)
-        return total
-
     def _log_calc_result(self, total, prices, country, quantity):
         """
         Log the result of calculation
@@ -238,6 +461,41 @@ Quantity: {}. Service: {}.'
             ))
 
 
+class BulkCalc(object):
+    """
+    Calculate the prices of the many client services at once
+    """
+
+    def __init__(self, entries) -> None:
+        if isinstance(entries, QuerySet):
+            entries = entries.select_related('client')
+        self.entries = list(entries)
+
+    def calc(self) -> dict:
+        """
+        Calc prices (client service => price)
+        """
+        keys = []
+        for entry in self.entries:
+            if not entry.quantity or not entry.client.country_id:
+                raise CalcException('Invalid country or quantity.')
+            keys.append((entry.service_id, entry.client.country_id))
+
+        tables = price_tables.get_many(keys)
+        prices = {}
+        for entry, key in zip(self.entries, keys):
+            table = tables[key]
+            if not table.tiers:
+                raise CalcException('Empty prices.')
+            prices[entry] = table.total(entry.quantity)
+
+        logging.getLogger('billing').info(
+            'Bulk calc result: {}.'.format(', '.join(
+                ['#{}: {}'.format(e.pk, p) for e, p in prices.items()])))
+
+        return prices
+
+
 class Rooms(Calc):
     """
     Calc rooms service
@@ -0,0 +1,147 @@
+"""
+The orders notes rendering
+
+The notes are rendered for the translated note fields only. The rendered
+notes are cached by the fingerprint of the order content, so the orders
+with the unchanged services are not rendered again. In the lazy mode
+(MB_ORDER_NOTES_LAZY) the saved notes are cleared and rendered
+on the first read.
+
+The cache keys contain the version of the note template source and
+MB_ORDER_NOTES_VERSION, the setting is increased after the notes
+translations changes.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Value, When
+from django.template.loader import get_template
+from django.utils import timezone, translation
+
+from billing.lib.trans import get_field_languages
+
+CACHE_PREFIX = 'order_note'
+
+TEMPLATE = 'finances/order_note.md'
+
+
+def get_version() -> str:
+    """
+    Get the version of the note template and translations
+    """
+    source = get_template(TEMPLATE).template.source
+    data = '{}_{}'.format(settings.MB_ORDER_NOTES_VERSION, source)
+    return hashlib.md5(data.encode()).hexdigest()
+
+
+def get_client_services(order) -> list:
+    """
+    Get the order client services with the services
+    """
+    if 'client_services' in getattr(order, '_prefetched_objects_cache', {}):
+        return list(order.client_services.all())
+    return list(order.client_services.select_related('service'))
+
+
+def get_fingerprint(client_services) -> str:
+    """
+    Get the fingerprint of the rendered client services
+    """
+    data = [(s.pk, s.service_id, s.service.modified, str(s.price),
+             s.quantity, s.begin, s.end)
+            for s in sorted(client_services, key=lambda s: s.pk)]
+    data.append(timezone.get_current_timezone_name())
+    return hashlib.md5(repr(data).encode()).hexdigest()
+
+
+def get_fields(order) -> dict:
+    """
+    Get the note fields by the languages
+    """
+    return {
+        code: 'note_{}'.format(code)
+        for code in get_field_languages(type(order), 'note')
+    }
+
+
+def render(order, client_services=None) -> dict:
+    """
+    Render the order notes
+    Returns the note field => the note.
+    """
+    if client_services is None:
+        client_services = get_client_services(order)
+    if not client_services:
+        return {}
+
+    fingerprint = get_fingerprint(client_services)
+    version = get_version()
+    fields = get_fields(order)
+    keys = {
+        code: '{}_{}_{}_{}'.format(CACHE_PREFIX, version, code, fingerprint)
+        for code in fields
+    }
+    cached = cache.get_many(keys.values())
+    notes = {}
+    rendered = {}
+    for code, field in fields.items():
+        key = keys[code]
+        if key not in cached:
+            with translation.override(code):
+                rendered[key] = order.generate_note(client_services)
+        notes[field] = cached.get(key, rendered.get(key))
+    if rendered:
+        cache.set_many(rendered)
+
+    return notes
+
+
+def update(order, client_services=None):
+    """
+    Update the notes of the saved order
+    """
+    if settings.MB_ORDER_NOTES_LAZY:
+        notes = dict.fromkeys(get_fields(order).values())
+    else:
+        notes = render(order, client_services)
+    for field, note in notes.items():
+        setattr(order, field, note)
+
+    return order
+
+
+def ensure(order):
+    """
+    Render and save the lazily cleared order notes
+    """
+    ensure_many([order])
+    return order
+
+
+def ensure_many(orders) -> list:
+    """
+    Render and save the lazily cleared notes of the orders
+    The notes of all the orders are saved with a single update query.
+    """
+    orders = list(orders)
+    if not settings.MB_ORDER_NOTES_LAZY or not orders:
+        return orders
+    fields = get_fields(orders[0]).values()
+
+    pks, updates = [], {}
+    for order in orders:
+        if not order.pk or all(getattr(order, f) for f in fields):
+            continue
+        notes = render(order)
+        if notes:
+            pks.append(order.pk)
+        for field, note in notes.items():
+            setattr(order, field, note)
+            updates.setdefault(field, []).append(
+                When(pk=order.pk, then=Value(note)))
+    if pks:
+        type(orders[0]).objects.filter(pk__in=pks).update(
+            **{f: Case(*w, default=f) for f, w in updates.items()})
+
+    return orders
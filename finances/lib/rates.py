@@ -9,6 +9,8 @@ from djmoney.contrib.exchange.models import convert_money as base_convert_money
 from djmoney.contrib.exchange.models import get_rate
 from djmoney.money import Money
 
+from billing.lib.cache import invalidate_tags
+
 logger = logging.getLogger('billing')
 
 
@@ -18,6 +20,7 @@ def update_exchange_rates():
     """
     log_exchange_rates()
     call_command('update_rates')
+    invalidate_tags(Rate)
     logger.info('Rates have been updated.')
 
 
@@ -52,3 +55,17 @@ def convert_money(money: Money, targer_currency) -> Optional[Money]:
     except MissingRate as e:
         logger.error('Exchange rates error: {}'.format(str(e)))
     return None
+
+
+def convert_amounts(amounts, base_currency: str,
+                    target_currency: str) -> Optional[list]:
+    """
+    Convert the amounts with a single exchange rate lookup
+    The amounts are converted the same way as convert_money converts them.
+    """
+    rate = get_exchange_rate(base_currency, target_currency)
+    if rate is None:
+        return None
+    return [
+        Money(amount * rate, target_currency).amount for amount in amounts
+    ]
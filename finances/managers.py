@@ -134,6 +134,17 @@ class PriceManager(models.Manager):
             query = base_query.filter(country__isnull=True)
         return query
 
+    def filter_by_countries(self, countries, services):
+        """
+        Get prices for countries and services including the base prices
+        Use it to fetch the prices for many services in a single query.
+        """
+        return self.filter(
+            Q(country__in=countries) | Q(country__isnull=True),
+            service__in=services,
+            is_enabled=True,
+        )
+
 
 class ServiceManager(LookupMixin):
     """"
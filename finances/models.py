@@ -8,7 +8,8 @@ from django.contrib.auth.models import User
 from django.contrib.postgres.fields import JSONField
 from django.core.validators import (MaxValueValidator, MinLengthValidator,
                                     MinValueValidator, ValidationError)
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
 from django_extensions.db.models import TimeStampedModel, TitleDescriptionModel
@@ -19,12 +20,14 @@ from moneyed import EUR, Money
 
 from billing.exceptions import BaseException
 from billing.lib.lang import get_lang
+from billing.lib.signals import suppress_signals
 from billing.models import CachedModel, CommonInfo
 from clients.models import Client, ClientService
 from finances.systems.lib import BraintreeGateway
 from hotels.models import Country
 from users.models import Department
 
+from .lib import notes
 from .managers import (DiscountManager, OrderManager, PriceManager,
                        ServiceManager, SubscriptionManager)
 from .validators import validate_code, validate_price_periods
@@ -152,6 +155,7 @@ class Price(CachedModel, CommonInfo, TimeStampedModel):
     Price class
     """
     objects = PriceManager()
+    tracker = FieldTracker(fields=('service', ))
 
     price = MoneyField(
         max_digits=20,
@@ -529,6 +533,72 @@ class Order(CommonInfo, TimeStampedModel):
             logger = logging.getLogger('billing')
             logger.error('Order corrupted #{}.'.format(self.pk))
 
+    def calculate(self, client_services):
+        """
+        Calculate the order status and price by the client services
+        The services are counted in the adding order as the order signals
+        counted them. Returns whether the other new rooms orders of
+        the client should be canceled.
+        """
+        currencies = set()
+        cancel_rooms = False
+        for client_service in client_services:
+            currencies.add(client_service.price.currency)
+            if len(currencies) > 1:
+                self.status = 'corrupted'
+            service = client_service.service
+            if self.status == 'new' and service.type == 'rooms' and \
+               service.period_units in ('month', 'year'):
+                cancel_rooms = True
+
+        if self.status == 'corrupted':
+            self.price = Money(0, EUR)
+        elif not self.price:
+            total = 0
+            for client_service in client_services:
+                if client_service.is_enabled:
+                    total += client_service.price
+            self.price = self.apply_discount(total if total else 0)
+
+        return cancel_rooms
+
+    def finalize(self, client_services=()):
+        """
+        Add the client services to the order and update it at once
+        The corruption, price and notes are calculated once instead of
+        the order signals on every change.
+        """
+        with transaction.atomic(), suppress_signals('order'):
+            if not self.expired_date:
+                self.expired_date = arrow.utcnow().shift(
+                    days=+settings.MB_ORDER_EXPIRED_DAYS).datetime
+            if not self.pk:
+                self.save()
+            if client_services:
+                self.client_services.add(*client_services)
+
+            getattr(self, '_prefetched_objects_cache', {}).pop(
+                'client_services', None)
+            prefetch_related_objects([self], Prefetch(
+                'client_services',
+                queryset=ClientService.objects.select_related('service')))
+            services = self.client_services.all()
+
+            was_corrupted = self.status == 'corrupted'
+            if self.calculate(services):
+                Order.objects.get_by_service_type(
+                    self.client, 'rooms').exclude(pk=self.pk).update(
+                        status='canceled')
+            if self.status == 'corrupted' and not was_corrupted:
+                logger = logging.getLogger('billing')
+                logger.error('Order corrupted #{}.'.format(self.pk))
+
+            if services:
+                notes.update(self, list(services))
+            self.save()
+
+        return self
+
     def set_paid(self, payment_system):
         """
         Set paid orders
@@ -537,18 +607,24 @@ class Order(CommonInfo, TimeStampedModel):
         self.payment_system = payment_system
         self.paid_date = arrow.utcnow().datetime
         self.full_clean()
-        self.save()
+        with transaction.atomic():
+            self.save()
 
     @property
     def price_str(self):
         return '{} {}'.format(self.price.amount, self.price.currency)
 
-    def generate_note(self):
+    def generate_note(self, client_services=None):
         """
         Generate and return default order note
         """
-        if self.client_services.count():
-            return render_to_string('finances/order_note.md', {'order': self})
+        if client_services is None:
+            client_services = self.client_services.select_related('service')
+        if client_services:
+            return render_to_string('finances/order_note.md', {
+                'order': self,
+                'client_services': client_services
+            })
         return None
 
     def clean(self, *args, **kwargs):
@@ -1,6 +1,7 @@
 """
 The finances serializers module
 """
+from django.db import models
 from django.utils.translation import get_language
 from django.utils.translation import ugettext_lazy as _
 from djmoney.contrib.exchange.models import Rate
@@ -10,6 +11,7 @@ from rest_framework import serializers
 
 from billing.serializers import ValidationSerializerMixin
 
+from .lib import notes
 from .models import Order, Price, Service, ServiceCategory, Transaction
 
 
@@ -65,6 +67,27 @@ class CalcQuerySerializer(serializers.Serializer):
     country = serializers.CharField(max_length=2, min_length=2)
 
 
+class CalcMatrixQuerySerializer(serializers.Serializer):
+    """
+    CalcMatrixQuery model
+    """
+    quantity_from = serializers.IntegerField(
+        min_value=1, max_value=1000, required=False, default=1)
+    quantity_to = serializers.IntegerField(min_value=1, max_value=1000)
+    period_units = serializers.ChoiceField(
+        choices=['month', 'year', 'day'],
+        required=False,
+        default='month',
+    )
+    country = serializers.CharField(max_length=2, min_length=2)
+
+    def validate(self, data):
+        if data['quantity_from'] > data['quantity_to']:
+            raise serializers.ValidationError(
+                _('Please correct the quantity range.'))
+        return data
+
+
 class PaymentSystemListSerializer(serializers.Serializer):
     """
     PaymentSystem list serializer
@@ -98,6 +121,20 @@ class TransactionSerializer(serializers.HyperlinkedModelSerializer):
                   'modified_by')
 
 
+class OrderListSerializer(serializers.ListSerializer):
+    """
+    Order list serializer
+    """
+
+    def to_representation(self, data):
+        """
+        Render the lazy orders notes at once
+        """
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        orders = notes.ensure_many(iterable)
+        return super(OrderListSerializer, self).to_representation(orders)
+
+
 class OrderSerializer(serializers.HyperlinkedModelSerializer):
     """
     Order serializer
@@ -110,8 +147,16 @@ class OrderSerializer(serializers.HyperlinkedModelSerializer):
     created_by = serializers.StringRelatedField(many=False, read_only=True)
     modified_by = serializers.StringRelatedField(many=False, read_only=True)
 
+    def to_representation(self, instance):
+        """
+        Render the lazy order notes
+        """
+        notes.ensure(instance)
+        return super(OrderSerializer, self).to_representation(instance)
+
     class Meta:
         model = Order
+        list_serializer_class = OrderListSerializer
         fields = ('id', 'status', 'note', 'price', 'price_currency',
                   'expired_date', 'paid_date', 'payment_system', 'client',
                   'client_services', 'created', 'modified', 'created_by',
@@ -2,17 +2,45 @@ import logging
 
 import arrow
 from django.conf import settings
-from django.db.models.signals import m2m_changed, post_save, pre_save
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
 from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
-from billing.lib.trans import auto_populate
+from billing.lib import outbox
+from billing.lib.signals import suppressible
+from clients.lib.services import services_batch
+from clients.models import Client
 from clients.tasks import mail_client_task
 
-from .models import Discount, Order
+from .lib import notes
+from .lib.calc import price_tables
+from .models import Discount, Order, Price, Service
 from .tasks import order_notify_task
 
 
+@receiver(post_save, sender=Price, dispatch_uid='price_post_save')
+@receiver(post_delete, sender=Price, dispatch_uid='price_post_delete')
+def price_post_save(sender, **kwargs):
+    """
+    Price post save && delete signal
+    """
+    instance = kwargs['instance']
+    price_tables.invalidate(instance.service_id)
+    prev_service = instance.tracker.previous('service')
+    if prev_service and prev_service != instance.service_id:
+        price_tables.invalidate(prev_service)
+
+
+@receiver(post_save, sender=Service, dispatch_uid='service_post_save')
+@receiver(post_delete, sender=Service, dispatch_uid='service_post_delete')
+def service_post_save(sender, **kwargs):
+    """
+    Service post save && delete signal
+    """
+    price_tables.invalidate(kwargs['instance'].pk)
+
+
 @receiver(pre_save, sender=Discount, dispatch_uid='discount_pre_save')
 def discount_pre_save(sender, **kwargs):
     """
@@ -44,6 +72,7 @@ def discount_post_save(sender, **kwargs):
 
 
 @receiver(pre_save, sender=Order, dispatch_uid='order_pre_save')
+@suppressible('order')
 def order_pre_save(sender, **kwargs):
     """
     Order pre save
@@ -57,7 +86,31 @@ def order_pre_save(sender, **kwargs):
     if not order.price and order.id:
         order.price = order.calc_price()
     if order.id and order.client_services.count():
-        auto_populate(order, 'note', order.generate_note)
+        notes.update(order)
+
+
+def update_client_paid(order, created):
+    """
+    Update the first paid order dates of the order clients
+    """
+    tracker = order.tracker
+    if not created and not any(
+            tracker.has_changed(f)
+            for f in ('status', 'client_id', 'paid_date')):
+        return None
+
+    if not created and tracker.previous('status') == 'paid':
+        Client.objects.update_first_paid(
+            Client.objects.filter(
+                pk__in=(tracker.previous('client_id'), order.client_id)))
+    elif order.status == 'paid':
+        Client.objects.set_paid(order.client_id, order.paid_date
+                                or order.created)
+    else:
+        return None
+
+    if Order.client.is_cached(order):
+        order.client.refresh_from_db(fields=['first_paid_at'])
 
 
 @receiver(post_save, sender=Order, dispatch_uid='order_post_save')
@@ -66,39 +119,55 @@ def order_post_save(sender, **kwargs):
     Order post save
     """
     order = kwargs['instance']
+    update_client_paid(order, kwargs['created'])
 
     if not kwargs['created'] and order.tracker.has_changed('status') and \
        order.status == 'paid':
 
-        mail_client_task.delay(subject=_('Thank you for your payment!'),
-                               template='emails/order_paid.html',
-                               data={
-                                   'order_id': order.pk,
-                                   'name': order.client.name,
-                                   'created':
-                                   order.created.strftime('%d.%m.%Y')
-                               },
-                               client_id=order.client.id)
+        outbox.enqueue(
+            mail_client_task,
+            kwargs={
+                'subject': _('Thank you for your payment!'),
+                'template': 'emails/order_paid.html',
+                'data': {
+                    'order_id': order.pk,
+                    'name': order.client.name,
+                    'created': order.created.strftime('%d.%m.%Y')
+                },
+                'client_id': order.client.id
+            })
 
         logger = logging.getLogger('billing')
         logger.info('Order paid #{}. Payment system: {}'.format(
             order.pk, order.payment_system))
 
         order.client.check_status()
-        for service in order.client_services.all():
-            if service.begin <= arrow.utcnow().datetime:
-                service.status = 'active'
-            service.is_paid = True
-            service.save()
-        order.client.restrictions_update()
+        with services_batch():
+            for service in order.client_services.all():
+                if service.begin <= arrow.utcnow().datetime:
+                    service.status = 'active'
+                service.is_paid = True
+                service.save()
 
     if kwargs['created']:
-        order_notify_task.apply_async((order.id, ), countdown=1)
+        outbox.enqueue(order_notify_task, (order.id, ))
+
+
+@receiver(post_delete, sender=Order, dispatch_uid='order_post_delete')
+def order_post_delete(sender, **kwargs):
+    """
+    Order post delete
+    """
+    order = kwargs['instance']
+    if order.status == 'paid':
+        Client.objects.update_first_paid(
+            Client.objects.filter(pk=order.client_id))
 
 
 @receiver(m2m_changed,
           sender=Order.client_services.through,
           dispatch_uid='order_m2m_changed')
+@suppressible('order')
 def order_m2m_changed(sender, **kwargs):
     """
     Order m2m_changed
@@ -119,7 +188,7 @@ def order_m2m_changed(sender, **kwargs):
 
     is_changed = False
     if order.client_services.count():
-        auto_populate(order, 'note', order.generate_note)
+        notes.update(order)
         is_changed = True
     if not order.price:
         order.price = order.calc_price()
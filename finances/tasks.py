@@ -1,12 +1,18 @@
 import logging
 
 import arrow
+from celery import group
 from django.apps import apps
+from django.conf import settings
+from django.db import transaction
 from django.utils.translation import ugettext_lazy as _
 
 from billing.celery import app
+from billing.lib import outbox
+from billing.lib.chunks import chunked_task
 from billing.lib.lang import select_locale
-from billing.lib.messengers.mailer import mail_client
+from billing.lib.locks import locked_task
+from billing.lib.messengers.mailer import mail_batch, mail_client
 
 from .lib.rates import update_exchange_rates
 
@@ -19,7 +25,8 @@ def update_exchange_rates_task():
     update_exchange_rates()
 
 
-@app.task
+@app.task(queue=settings.CELERY_MAIL_QUEUE)
+@outbox.once
 def order_notify_task(order_id):
     """
     Order client notification
@@ -53,54 +60,94 @@ def order_notify_task(order_id):
         logger.error('Order notify task failed {}.'.format(order_id))
 
 
-@app.task
-def orders_payment_notify():
+@chunked_task(
+    lambda: apps.get_model('finances', 'Order').objects.
+    get_for_payment_notification(),
+    context=mail_batch,
+    queue=settings.CELERY_MAIL_QUEUE)
+def orders_payment_notify(order):
     """
     Order payments notification
     """
-    orders = apps.get_model('finances',
-                            'Order').objects.get_for_payment_notification()
-    for order in orders:
-        greetings_new = ''
-        client = order.client
-        with select_locale(client):
-            if client.is_trial:
-                greetings_new = '<p>{}</p>'.format(
-                    _('We are glad to see you among our clients!'))
-
-            mail_client(
-                subject=_(
-                    'Invoice is due - don’t forget to extend your access! '),
-                template='emails/order_payment_notification.html',
-                data={
-                    'order': order,
-                    'client': client,
-                    'greetings_new': greetings_new
-                },
-                client=order.client)
+    greetings_new = ''
+    client = order.client
+    with select_locale(client):
+        if client.is_trial:
+            greetings_new = '<p>{}</p>'.format(
+                _('We are glad to see you among our clients!'))
+
+        mail_client(
+            subject=_('Invoice is due - don’t forget to extend your access! '),
+            template='emails/order_payment_notification.html',
+            data={
+                'order': order,
+                'client': client,
+                'greetings_new': greetings_new
+            },
+            client=order.client)
+
+
+@app.task(queue=settings.CELERY_MAIL_QUEUE)
+def order_client_disabled_email_task(order_id):
+    """
+    Send the account suspension email to the order client
+    """
+    order_model = apps.get_model('finances', 'Order')
+    try:
+        order = order_model.objects.select_related('client').get(pk=order_id)
+    except order_model.DoesNotExist:
+        return False
+    client = order.client
+    mail_client(
+        subject=_('Oh No! Your Account has been suspended'),
+        template='emails/order_client_disabled.html',
+        data={
+            'url': client.url,
+            'name': client.name,
+            'order': order,
+            'created': order.created.strftime('%d.%m.%Y')
+        },
+        client=client)
+    return True
 
 
 @app.task
+@locked_task()
 def orders_clients_disable():
     """
     Expired orders clients disable
     """
-    orders = apps.get_model('finances', 'Order').objects.get_expired()
-    for order in orders:
-        client = order.client
-        client.status = 'disabled'
-        client.disabled_at = arrow.utcnow().datetime
-        client.save()
-        logger = logging.getLogger('billing')
-        logger.info('Client disabled {}.'.format(client))
+    order_model = apps.get_model('finances', 'Order')
+    client_model = apps.get_model('clients', 'Client')
+    now = arrow.utcnow().datetime
 
-        mail_client(
-            subject=_('Oh No! Your Account has been suspended'),
-            template='emails/order_client_disabled.html',
-            data={
-                'url': order.client.url,
-                'name': client.name,
-                'order': order,
-                'created': order.created.strftime('%d.%m.%Y')
-            },
-            client=order.client)
+    with transaction.atomic():
+        # the latest expired order by the client
+        orders = dict(order_model.objects.get_expired().order_by(
+            'client_id', 'expired_date', 'pk').values_list('client_id', 'pk'))
+        clients = list(
+            client_model.objects.select_for_update().filter(
+                pk__in=list(orders)).exclude(
+                    status__in=('disabled', 'archived')).values_list(
+                        'pk', 'installation'))
+        client_model.objects.filter(pk__in=[pk for pk, _ in clients]).update(
+            status='disabled', disabled_at=now, modified=now)
+
+    if not clients:
+        return 0
+    logging.getLogger('billing').info('Clients disabled: {}.'.format(
+        ', '.join([str(pk) for pk, _ in clients])))
+
+    tasks = [
+        order_client_disabled_email_task.si(orders[pk]) for pk, _ in clients
+    ]
+    installed = [pk for pk, i in clients if i == 'installed']
+    if installed:
+        tasks.append(
+            app.signature(
+                'clients.tasks.invalidate_clients_cache_task',
+                args=(installed, ),
+                immutable=True))
+    group(tasks).apply_async()
+
+    return len(clients)
@@ -1,12 +1,16 @@
+import random
+from decimal import Decimal
+
 import pytest
 from django.test import TestCase
 from django.urls import reverse
 from moneyed import AED, EUR, RUB, Money
 
 from clients.models import ClientService
-from finances.lib.calc import (Calc, CalcException, Other, Rooms,
-                               get_currency_by_country)
-from finances.models import Service
+from finances.lib.calc import (BulkCalc, Calc, CalcException, Other,
+                               PriceTable, Rooms, get_currency_by_country,
+                               price_tables)
+from finances.models import Price, Service
 from hotels.models import Country
 
 pytestmark = pytest.mark.django_db
@@ -77,6 +81,83 @@ def test_calc_price(make_prices):
         Calc.factory(4).calc(quantity=12, country=1)
 
 
+class PriceStub(object):
+    """
+    The price stub compared by identity like the saved Price entries
+    """
+
+    def __init__(self, price, period_from, period_to, for_unit):
+        self.price = price
+        self.period_from = period_from
+        self.period_to = period_to
+        self.for_unit = for_unit
+
+
+def calc_total_price_by_units(prices, quantity):
+    """
+    The reference per-unit calculation
+    """
+    table = []
+    default = [d for d in prices if d.for_unit]
+
+    for r in range(1, quantity + 1):
+        p = [
+            p for p in prices
+            if (p.period_from is None or p.period_from <= r) and (
+                p.period_to is None or p.period_to >= r)
+        ]
+        if p and not p[0].for_unit and p[0] in table:
+            p[0] = 0
+        if not p:
+            p.append(default[0] if default else 0)
+        table.append(p[0])
+
+    total = 0
+    for item in table:
+        total += getattr(item, 'price', 0)
+    return total
+
+
+def test_price_table_total_equals_per_unit_calc():
+    generator = random.Random(42)
+
+    def bound():
+        return generator.choice([None, 0] + list(range(1, 40)))
+
+    for _ in range(500):
+        prices = [
+            PriceStub(
+                Money(Decimal(generator.randint(0, 10000)) / 100, EUR),
+                bound(),
+                bound(),
+                generator.random() > 0.3,
+            ) for _ in range(generator.randint(0, 6))
+        ]
+        table = PriceTable(prices)
+        amounts, currency = table.totals(59)
+        for quantity in range(0, 60):
+            total = calc_total_price_by_units(prices, quantity)
+            assert table.total(quantity) == total
+            if quantity:
+                assert amounts[quantity - 1] == getattr(total, 'amount', 0)
+
+
+def test_bulk_calc(make_prices, django_assert_num_queries):
+    ClientService.objects.filter(pk=1).update(service_id=4, quantity=35)
+    price_tables.tables.clear()
+
+    with django_assert_num_queries(2):
+        prices = BulkCalc(ClientService.objects.all()).calc()
+    with django_assert_num_queries(1):
+        prices_by_manager = ClientService.objects.calc_prices()
+
+    assert len(prices) == ClientService.objects.count()
+    assert prices == prices_by_manager
+    for client_service, price in prices.items():
+        assert price == Calc.factory(client_service).calc()
+    assert prices[ClientService.objects.get(pk=1)] == Money(1897, EUR)
+
+
 def test_calc_api_by_user(client):
     response = client.get(reverse('service-calc'))
     assert response.status_code == 401
@@ -161,6 +242,59 @@ def test_calc_api_by_admin(admin_client, make_prices):
     assert response_4.json() == response_data_3
 
 
+def test_calc_matrix_api_by_admin(admin_client, make_prices):
+    url = reverse('service-calc-matrix')
+
+    response_invalid = admin_client.get(
+        url + '?quantity_from=5&quantity_to=2&country=us')
+    response = admin_client.get(
+        url + '?quantity_from=10&quantity_to=12&country=us')
+
+    assert response_invalid.json()['status'] is False
+    assert response.status_code == 200
+    data = response.json()
+    assert data['status'] is True
+    assert data['quantity_from'] == 10
+    assert data['quantity_to'] == 12
+    assert [p['period'] for p in data['prices']] == [1, 3]
+    assert data['prices'][0]['price_currency'] == 'EUR'
+    assert data['prices'][0]['price_currency_local'] == 'USD'
+    assert data['prices'][0]['prices'][-1] == 492.0
+    assert data['prices'][0]['prices_local'][-1] == 556.403784
+    assert data['prices'][1]['prices'][-1] == 27600.0
+    assert data['prices'][1]['prices_local'][-1] == 31212.8952
+
+
+def test_price_tables_service_change(make_prices):
+    service = Service.objects.get(pk=4)
+    country = Country.objects.get(pk=1)
+    calc = Calc.factory(service)
+    price = calc.calc(quantity=35, country=country)
+
+    moved = Price.objects.filter(
+        service=service, country=country, period_from=11).first()
+    moved.service = Service.objects.get(pk=5)
+    moved.save()
+
+    assert calc.calc(quantity=35, country=country) != price
+
+
+def test_calc_matrix_matches_calc(admin_client, make_prices):
+    url = reverse('service-calc-matrix')
+    data = admin_client.get(
+        url + '?quantity_from=10&quantity_to=12&country=us').json()
+
+    for prices in data['prices']:
+        for quantity in range(10, 13):
+            price = admin_client.get(
+                reverse('service-calc') +
+                '?quantity={}&country=us&period={}'.format(
+                    quantity, prices['period'])).json()
+            assert prices['prices'][quantity - 10] == price['price']
+            assert prices['prices_local'][quantity - 10] == \
+                price['price_local']
+
+
 def test_get_currency_by_country():
     assert get_currency_by_country('ru') == RUB
     assert get_currency_by_country(Country.objects.get(tld='ae')) == AED
@@ -175,7 +309,24 @@ class CalcTestCase(TestCase):
 
         with self.assertNumQueries(8):
             admin_client.get(url + '?quantity=12&country=us&period=3')
-        with self.assertNumQueries(7):
+        with self.assertNumQueries(5):
             admin_client.get(url + '?quantity=22&country=us&period=3')
         with self.assertNumQueries(2):
             admin_client.get(url + '?quantity=12&country=us&period=3')
+
+    def test_calc_price_tables_cache(self):
+        service = Service.objects.get(pk=4)
+        country = Country.objects.get(pk=1)
+        calc = Calc.factory(service)
+        price = calc.calc(quantity=35, country=country)
+
+        with self.assertNumQueries(0):
+            assert calc.calc(quantity=35, country=country) == price
+            assert calc.calc(quantity=10, country=country) == Money(422, EUR)
+
+        Price.objects.filter(
+            service=service,
+            country=country,
+            period_from=11,
+        ).first().delete()
+        assert calc.calc(quantity=35, country=country) != price
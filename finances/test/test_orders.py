@@ -1,6 +1,7 @@
 import arrow
 import pytest
 from django.conf import settings
+from django.contrib import admin
 from django.urls import reverse
 from moneyed import EUR, RUB, Money
 
@@ -8,6 +9,8 @@ from billing.lib.test import json_contains
 from clients.models import Client, ClientRu, ClientService, Company
 from clients.tasks import client_services_update
 
+from ..admin import OrderAdmin
+from ..lib import notes
 from ..models import ClientDiscount, Order, Price, Service
 from ..tasks import orders_clients_disable, orders_payment_notify
 
@@ -305,6 +308,19 @@ def test_orders_clients_disable(make_orders, mailoutbox):
     assert client.status == 'active'
 
 
+def test_orders_clients_disable_once(make_orders, mailoutbox):
+    order = Order.objects.get_expired().first()
+    Order.objects.filter(client=order.client).exclude(pk=order.pk).update(
+        status='new', expired_date=arrow.utcnow().shift(days=-1).datetime)
+    assert Order.objects.get_expired().count() > 1
+
+    assert orders_clients_disable.delay().get() == 1
+    mailoutbox = [m for m in mailoutbox if 'has been suspended' in m.subject]
+    assert len(mailoutbox) == 1
+    assert mailoutbox[0].recipients() == [order.client.email]
+    assert Order.objects.get_expired().count() == 0
+
+
 def test_orders_services_activation(make_orders):
     order = Order.objects.get(pk=1)
     order.client_services.add(1, 2)
@@ -344,3 +360,145 @@ def test_order_paid_email(make_orders, mailoutbox):
     assert mailoutbox[-1].recipients() == ['user@rus.com']
     assert 'Спасибо за Ваш платеж' in mailoutbox[-1].subject
     assert '№5' in mailoutbox[-1].alternatives[0][0]
+
+
+def test_order_finalize(mailoutbox, mocker):
+    """
+    The order should be updated once for all the added client services
+    """
+    generate_note = mocker.spy(Order, 'generate_note')
+    order = Order()
+    order.client_id = 1
+    order.finalize([1, 2])
+    order.refresh_from_db()
+
+    assert generate_note.call_count == len(
+        settings.MODELTRANSLATION_LANGUAGES)
+    assert order.status == 'new'
+    assert order.price == Money(14001.83, EUR)
+    assert order.expired_date
+    assert 'Test service two' in order.note_en
+    assert 'Тестовый сервис' in order.note_ru
+    assert order.client_services.count() == 2
+    assert len(mailoutbox) == 1
+
+    order.price = Money(111.25, EUR)
+    order.finalize()
+    order.refresh_from_db()
+    assert order.price == Money(111.25, EUR)
+
+
+def test_order_finalize_corrupted():
+    """
+    The order with the services in the different currencies is corrupted
+    """
+    order = Order(client_id=1)
+    order.finalize([5, 4])
+
+    assert order.status == 'corrupted'
+    assert order.price == Money(0, EUR)
+
+
+def test_order_finalize_rooms_orders(make_orders):
+    """
+    The finalized rooms order should cancel the other new rooms orders
+    """
+    client_service = ClientService.objects.get(
+        client_id=1, service__type='rooms')
+    order_one = Order.objects.get(pk=1)
+    order_two = Order.objects.get(pk=4)
+    order_one.finalize([client_service])
+    order_two.finalize([client_service])
+    order_one.refresh_from_db()
+    order_two.refresh_from_db()
+
+    assert order_one.status == 'canceled'
+    assert order_two.status == 'new'
+
+
+def test_order_notes_cache(mocker):
+    """
+    The notes of the orders with the same content should be rendered once
+    """
+    Order(client_id=1).finalize([1, 2])
+    generate_note = mocker.spy(Order, 'generate_note')
+    order = Order(client_id=1).finalize([1, 2])
+
+    assert generate_note.call_count == 0
+    assert 'Test service two' in order.note_en
+    assert 'Тестовый сервис' in order.note_ru
+    assert not hasattr(order, 'note_de')
+
+    ClientService.objects.filter(pk=1).update(quantity=11)
+    rendered = notes.render(Order.objects.get(pk=order.pk))
+
+    assert generate_note.call_count == 2
+    assert set(rendered) == {'note_en', 'note_ru'}
+    assert '- 11 (' in rendered['note_en']
+
+
+def test_order_notes_lazy(settings):
+    """
+    The lazy notes should be rendered on the first read
+    """
+    settings.MB_ORDER_NOTES_LAZY = True
+    order = Order(client_id=1).finalize([1, 2])
+    order.refresh_from_db()
+
+    assert order.note_en is None
+    assert order.note_ru is None
+
+    notes.ensure(order)
+    order.refresh_from_db()
+
+    assert 'Test service two' in order.note_en
+    assert 'Тестовый сервис' in order.note_ru
+
+
+def test_order_notes_lazy_list(admin_client, settings):
+    """
+    The lazy notes of the orders list should be rendered at once
+    """
+    settings.MB_ORDER_NOTES_LAZY = True
+    client_services_update.delay()
+    assert not Order.objects.filter(note_en__isnull=False).exists()
+
+    response = admin_client.get(reverse('order-list'))
+    assert response.status_code == 200
+    json_contains(response, 'Test service two - 7,000.00')
+    assert not Order.objects.filter(note_en__isnull=True).exists()
+    assert not Order.objects.filter(note_ru__isnull=True).exists()
+
+
+def test_order_notes_version(settings, mocker):
+    """
+    The cached notes should be rendered again after the version changes
+    """
+    order = Order(client_id=1).finalize([1, 2])
+    generate_note = mocker.spy(Order, 'generate_note')
+    notes.render(order)
+    assert generate_note.call_count == 0
+
+    settings.MB_ORDER_NOTES_VERSION += 1
+    notes.render(order)
+    assert generate_note.call_count == 2
+
+
+def test_order_admin_save_related(make_orders, mocker):
+    """
+    The admin should finalize the order only if its services have changed
+    """
+    finalize = mocker.patch.object(Order, 'finalize')
+    order_admin = OrderAdmin(Order, admin.site)
+    form = mocker.Mock(
+        changed_data=['note'], instance=Order.objects.get(pk=1))
+    order_admin.save_related(None, form, [], True)
+
+    assert finalize.call_count == 0
+
+    form.changed_data = ['note', 'client_services']
+    order_admin.save_related(None, form, [], True)
+
+    assert finalize.call_count == 1
+    order_admin.save_related(None, form, [], False)
+    assert finalize.call_count == 2
@@ -4,8 +4,6 @@ The finances views module
 import logging
 
 from django.http import HttpResponseNotFound
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django.views.decorators.clickjacking import xframe_options_exempt
 from django.views.decorators.csrf import csrf_exempt
 from djmoney.contrib.exchange.models import Rate
@@ -13,16 +11,18 @@ from rest_framework import viewsets
 from rest_framework.decorators import list_route
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_extensions.cache.mixins import CacheResponseMixin
+
+from billing.lib.cache import (CacheResponseMixin, cache_response,
+                               tagged_query_cache_key_func)
 
 from .filters import OrderFilterSet
-from .lib.calc import CalcByQuery, CalcException
+from .lib.calc import CalcByQuery, CalcException, CalcMatrixByQuery
 from .models import Order, Price, Service, ServiceCategory, Transaction
-from .serializers import (CalcQuerySerializer, OrderSerializer,
-                          PaymentSystemListSerializer, PaymentSystemSerializer,
-                          PriceSerializer, RateSerializer,
-                          ServiceCategorySerializer, ServiceSerializer,
-                          TransactionSerializer)
+from .serializers import (CalcMatrixQuerySerializer, CalcQuerySerializer,
+                          OrderSerializer, PaymentSystemListSerializer,
+                          PaymentSystemSerializer, PriceSerializer,
+                          RateSerializer, ServiceCategorySerializer,
+                          ServiceSerializer, TransactionSerializer)
 from .systems import manager
 
 
@@ -79,7 +79,8 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
     """
     queryset = Order.objects.all().select_related(
         'created_by', 'modified_by',
-        'client').prefetch_related('client_services')
+        'client').prefetch_related('client_services',
+                                   'client_services__service')
     search_fields = ('=id', '=client_services__id',
                      'client_services__service__title',
                      'client_services__service__description', 'client__name',
@@ -108,9 +109,11 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ServiceSerializer
     filter_fields = ('is_enabled', 'is_default', 'period_units', 'type',
                      'created')
+    cache_tags = ('finances.Service', 'finances.Price', 'hotels.Country',
+                  Rate)
 
     @list_route(methods=['get'], permission_classes=[IsAuthenticated])
-    @method_decorator(cache_page(60 * 60 * 24))
+    @cache_response(60 * 60 * 24, key_func=tagged_query_cache_key_func)
     def calc(self, request):
         """
         Calc serivice price
@@ -136,6 +139,36 @@ class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
 
         return Response(response)
 
+    @list_route(methods=['get'],
+                permission_classes=[IsAuthenticated],
+                url_path='calc-matrix')
+    @cache_response(60 * 60 * 24, key_func=tagged_query_cache_key_func)
+    def calc_matrix(self, request):
+        """
+        Calc the services prices of all periods for the quantity range
+        quantity_from - the first quantity, default 1
+        quantity_to - the last quantity
+        period_units - month, year, day
+        country - user country
+        """
+        query = CalcMatrixQuerySerializer(data=request.GET)
+
+        if not query.is_valid():
+            return Response({'errors': query.errors, 'status': False})
+
+        calc = CalcMatrixByQuery(query.data)
+        try:
+            response = {
+                'status': True,
+                'quantity_from': query.data['quantity_from'],
+                'quantity_to': query.data['quantity_to'],
+                'prices': calc.get_prices()
+            }
+        except CalcException as exception:
+            response = {'errors': {'calc': [str(exception)]}, 'status': False}
+
+        return Response(response)
+
 
 class PriceViewSet(viewsets.ReadOnlyModelViewSet):
     """
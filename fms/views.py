@@ -1,5 +1,6 @@
 from rest_framework import viewsets
-from rest_framework_extensions.cache.mixins import CacheResponseMixin
+
+from billing.lib.cache import CacheResponseMixin
 
 from .models import Fms, Kpp
 from .serializers import FmsSerializer, KppSerializer
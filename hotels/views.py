@@ -1,5 +1,6 @@
 from rest_framework import viewsets
-from rest_framework_extensions.cache.mixins import CacheResponseMixin
+
+from billing.lib.cache import CacheResponseMixin
 
 from .filters import CountryFilter
 from .models import City, Country, Property, Region, Room
@@ -52,6 +53,7 @@ class RegionViewSet(CacheResponseMixin, viewsets.ModelViewSet):
     search_fields = ('name', 'alternate_names', 'country__name',
                      'country__alternate_names')
     serializer_class = RegionSerializer
+    cache_tags = (Region, Country)
 
 
 class CityViewSet(CacheResponseMixin, viewsets.ModelViewSet):
@@ -62,3 +64,4 @@ class CityViewSet(CacheResponseMixin, viewsets.ModelViewSet):
     filter_fields = ('country', 'region', 'is_checked', 'is_enabled')
     search_fields = ('name', 'alternate_names')
     serializer_class = CitySerializer
+    cache_tags = (City, Region, Country)